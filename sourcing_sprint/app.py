@@ -1,17 +1,17 @@
 import json
 import re
+from copy import deepcopy
 from datetime import datetime
-from os.path import join as pjoin
 
 import streamlit as st
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
 
 from catalogue import (
     app_categories,
     can_save,
+    canonical_filter,
     countries,
     filter_catalogue_visualization,
-    filter_entry,
     form_availability,
     form_custodian,
     form_general_info_add,
@@ -20,9 +20,16 @@ from catalogue import (
     form_media,
     form_processed_from_primary,
     form_source_category,
+    get_catalogue_frame,
+    get_submission_info,
     load_catalogue,
-    make_choro_map,
+    region_ancestors,
     region_tree,
+    render_choro_map,
+    render_client_map,
+    save_entry,
+    save_validated_entry,
+    search_catalogue,
     select_entry_val,
 )
 
@@ -163,25 +170,10 @@ def add_page(submission_info_dict):
                 submission_info_dict["submitted_date"] = datetime.now().strftime(
                     "%m/%d/%Y, %H:%M:%S"
                 )
-                json.dump(
-                    entry_dict,
-                    open(
-                        pjoin("entries", f"{entry_dict['uid']}.json"),
-                        "w",
-                        encoding="utf-8",
-                    ),
-                    indent=2,
+                good_to_save, save_message = save_entry(
+                    entry_dict, submission_info_dict
                 )
-                json.dump(
-                    submission_info_dict,
-                    open(
-                        pjoin("entry_submitted_by", f"{entry_dict['uid']}.json"),
-                        "w",
-                        encoding="utf-8",
-                    ),
-                    indent=2,
-                )
-            else:
+            if not good_to_save:
                 st.markdown("##### Unable to save\n" + save_message)
         st.markdown(f"You are entering a new resource of type: *{entry_dict['type']}*")
         st.write(entry_dict)
@@ -204,9 +196,15 @@ def add_page(submission_info_dict):
 ##################
 ## SECTION: Explore the current catalogue
 ##################
+viz_page_sizes = [10, 25, 50, 100]
+viz_default_page_size = 25
+
+
 def viz_page(submission_info_dict):
     catalogue = [entry_ls[-1] for entry_ls in load_catalogue()]  # get latest update
-    filtered_catalogue = filter_catalogue_visualization(catalogue, app_categories)
+    filtered_catalogue, filter_dict = filter_catalogue_visualization(
+        catalogue, app_categories
+    )
     with st.expander("Map of entries", expanded=True):
         entry_location_type = st.radio(
             label="I want to visualize",
@@ -220,62 +218,101 @@ def viz_page(submission_info_dict):
             entry_location_type
             == "Where the organizations or data custodians are located"
         )
-        filtered_counts = {}
-        for entry in filtered_catalogue:
-            locations = (
-                [entry["custodian"]["location"]]
-                if show_by_org
-                else entry["languages"]["language_locations"]
+        location_field = "custodian_location" if show_by_org else "language_locations"
+        catalogue_frame = get_catalogue_frame(catalogue)
+        filtered_uids = [entry["uid"] for entry in filtered_catalogue]
+        client_map = st.checkbox(
+            label="Switch the locations and entry types in the map itself",
+            key="viz_client_map",
+        )
+        if client_map:
+            # the page is built once per catalogue version, the filters only fill in
+            # which entries it shows
+            components.html(
+                render_client_map(catalogue_frame, location_field, filtered_uids),
+                width=1150,
+                height=720,
+                scrolling=True,
             )
-            # be as specific as possible
-            locations = [
-                loc
-                for loc in locations
-                if not any([l in region_tree.get(loc, []) for l in locations])
-            ]
-            for loc in locations:
-                filtered_counts[loc] = filtered_counts.get(loc, 0) + 1
-        world_map = make_choro_map(filtered_counts)
-        folium_static(world_map, width=1150, height=600)
+        else:
+            fractional_counts = st.checkbox(
+                label="Split the entries with several locations between them",
+                key="viz_fractional_counts",
+            )
+            filtered_counts = catalogue_frame.aggregate(
+                (
+                    "location_counts",
+                    location_field,
+                    fractional_counts,
+                    canonical_filter(filter_dict),
+                ),
+                lambda: catalogue_frame.location_counts(
+                    location_field, filtered_uids, fractional=fractional_counts
+                ),
+            )
+            # same html as folium_static, reused across reruns that keep the same counts
+            components.html(render_choro_map(filtered_counts), width=1150, height=610)
     with st.expander("View selected resources", expanded=False):
         st.write("You can further select locations to select entries from here:")
-        filter_region_choices = sorted(
-            set(
-                [
-                    loc
-                    for entry in filtered_catalogue
-                    for loc in (
-                        [entry["custodian"]["location"]]
-                        if show_by_org
-                        else entry["languages"]["language_locations"]
-                    )
-                ]
-            )
-        )
+        # regions containing the entry locations can be selected as well
+        location_values = catalogue_frame.field_values(location_field, filtered_uids)
+        filter_region_choices = set(location_values["value"].unique())
+        for loc in list(filter_region_choices):
+            filter_region_choices |= region_ancestors.get(loc, set())
+        filter_region_choices = sorted(filter_region_choices)
         filter_locs = st.multiselect(
-            "View entries from the following locations:",
+            "View entries from the following locations (regions include the countries and regions they contain):",
             options=filter_region_choices,
             key="viz_select_location",
         )
-        filter_loc_dict = (
-            {"custodian": {"location": filter_locs}}
-            if show_by_org
-            else {"languages": {"language_locations": filter_locs}}
+        loc_uids = set(
+            catalogue_frame.filter_uids(
+                location_field, filtered_uids, filter_locs, within_regions=True
+            )
         )
-        filtered_catalogue_by_loc = [
-            entry
-            for entry in filtered_catalogue
-            if filter_entry(entry, filter_loc_dict)
+        result_uids = [
+            entry["uid"] for entry in filtered_catalogue if entry["uid"] in loc_uids
         ]
-        view_entry = st.selectbox(
+        search_query = st.text_input(
+            label="Search the selected entries by name, description, homepage or custodian:",
+            key="viz_search_entry",
+        )
+        if search_query:
+            result_uids = search_catalogue(
+                catalogue, search_query, k=len(result_uids), uids=set(result_uids)
+            )
+        # only the (uid, name, type) rows of the current page are sent to the browser
+        page_size = st.selectbox(
+            label="Entries per page:",
+            options=viz_page_sizes,
+            index=viz_page_sizes.index(viz_default_page_size),
+            key="viz_page_size",
+        )
+        n_pages = max(1, (len(result_uids) + page_size - 1) // page_size)
+        if st.session_state.get("viz_page", 1) > n_pages:
+            st.session_state["viz_page"] = n_pages
+        page = st.number_input(
+            label=f"Page (out of {n_pages}):",
+            min_value=1,
+            max_value=n_pages,
+            step=1,
+            key="viz_page",
+        )
+        page_uids = result_uids[(page - 1) * page_size : page * page_size]
+        page_rows = catalogue_frame.rows(page_uids)
+        st.table(page_rows)
+        page_names = dict(zip(page_rows["uid"], page_rows["name"]))
+        view_uid = st.selectbox(
             label="Select an entry to see more detail:",
-            options=filtered_catalogue_by_loc,
-            format_func=lambda entry: f"{entry['uid']} | {entry['description']['name']} -- {entry['description']['description']}",
+            options=page_uids,
+            format_func=lambda uid: f"{uid} | {page_names[uid]}",
             key="viz_select_entry",
         )
-        st.markdown(
-            f"##### *Type:* {view_entry['type']} *UID:* {view_entry['uid']} - *Name:* {view_entry['description']['name']}\n\n{view_entry['description']['description']}"
-        )
+        if view_uid is not None:
+            view_entry = catalogue_frame.entry(view_uid)
+            st.markdown(
+                f"##### *Type:* {view_entry['type']} *UID:* {view_entry['uid']} - *Name:* {view_entry['description']['name']}\n\n{view_entry['description']['description']}"
+            )
 
 
 ##################
@@ -284,7 +321,8 @@ def viz_page(submission_info_dict):
 def val_page(submission_info_dict):
     st.markdown("### Entry selection")
     catalogue = load_catalogue()  # all updates to flag already validated
-    entry_dict = select_entry_val(catalogue, app_categories)
+    # the catalogue is shared across reruns, edit a copy of the selected version
+    entry_dict = deepcopy(select_entry_val(catalogue, app_categories))
     st.markdown("### Entry Languages and Locations")
     if "languages" in entry_dict:
         form_languages_val(entry_dict, app_categories, countries, region_tree)
@@ -321,12 +359,7 @@ def val_page(submission_info_dict):
                 entry_dict, submission_info_dict, False
             )
             if good_to_save:
-                validation_info_dict = json.load(
-                    open(
-                        pjoin("entry_submitted_by", f"{entry_dict['uid']}.json"),
-                        encoding="utf-8",
-                    )
-                )
+                validation_info_dict = get_submission_info(entry_dict["uid"])
                 validation_info_dict["validated_by"] = submission_info_dict[
                     "validated_by"
                 ]
@@ -336,31 +369,10 @@ def val_page(submission_info_dict):
                 friendly_date = re.sub(
                     r"[^\w\s]", "_", validation_info_dict["validated_date"]
                 ).replace(" ", "_")
-                json.dump(
-                    entry_dict,
-                    open(
-                        pjoin(
-                            "entries",
-                            f"{entry_dict['uid']}-validated-{friendly_date}.json",
-                        ),
-                        "w",
-                        encoding="utf-8",
-                    ),
-                    indent=2,
-                )
-                json.dump(
-                    validation_info_dict,
-                    open(
-                        pjoin(
-                            "entry_submitted_by",
-                            f"{entry_dict['uid']}-validated-{friendly_date}.json",
-                        ),
-                        "w",
-                        encoding="utf-8",
-                    ),
-                    indent=2,
+                good_to_save, save_message = save_validated_entry(
+                    entry_dict, validation_info_dict, friendly_date
                 )
-            else:
+            if not good_to_save:
                 st.markdown("##### Unable to save\n" + save_message)
         st.markdown(f"You are validating a resource of type: *{entry_dict['type']}*")
         st.write(entry_dict)
@@ -1,15 +1,57 @@
-from .catalogue_forms import (
-    filter_catalogue_visualization,
-    filter_entry,
-    form_availability,
-    form_custodian,
-    form_general_info_add,
-    form_languages_add,
-    form_languages_val,
-    form_media,
-    form_processed_from_primary,
-    form_source_category,
-    select_entry_val,
+import importlib
+
+# submodules are only imported on first access, so that scripts using the storage or
+# query modules do not pull in streamlit, plotly or folium
+_exports = {
+    "catalogue_filters": ["compile_filter", "filter_entry"],
+    "catalogue_frame": ["canonical_filter", "get_catalogue_frame"],
+    "catalogue_forms": [
+        "filter_catalogue_visualization",
+        "form_availability",
+        "form_custodian",
+        "form_general_info_add",
+        "form_languages_add",
+        "form_languages_val",
+        "form_media",
+        "form_processed_from_primary",
+        "form_source_category",
+        "select_entry_val",
+    ],
+    "catalogue_search": ["search_catalogue"],
+    "catalogue_utils": [
+        "app_categories",
+        "can_save",
+        "get_submission_info",
+        "load_catalogue",
+        "save_entry",
+        "save_validated_entry",
+    ],
+    "geography": [
+        "countries",
+        "make_choro_map",
+        "region_ancestors",
+        "region_descendants",
+        "region_tree",
+        "render_choro_map",
+        "render_client_map",
+    ],
+}
+_export_modules = dict(
+    [(name, module) for module, names in _exports.items() for name in names]
 )
-from .catalogue_utils import app_categories, can_save, load_catalogue
-from .geography import countries, make_choro_map, region_tree
+
+__all__ = list(_export_modules)
+
+
+def __getattr__(name):
+    if name not in _export_modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(
+        importlib.import_module(f".{_export_modules[name]}", __name__), name
+    )
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
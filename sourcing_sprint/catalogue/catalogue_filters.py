@@ -0,0 +1,60 @@
+def filter_entry(entry, filter_dct):
+    res = True
+    for k, v in entry.items():
+        if k in filter_dct:
+            if isinstance(v, dict):
+                res = res and filter_entry(v, filter_dct[k])
+            elif isinstance(v, list):
+                res = res and (
+                    len(filter_dct[k]) == 0 or any([e in filter_dct[k] for e in v])
+                )
+            else:
+                res = res and (len(filter_dct[k]) == 0 or v in filter_dct[k])
+    return res
+
+
+def _compile_checks(filter_dct, path, checks):
+    for k, accepted in filter_dct.items():
+        key_path = path + (k,)
+        if isinstance(accepted, dict):
+            # filter_entry only descends if the entry has a dict there, a plain value
+            # is checked against the keys of the sub-filter instead
+            if len(accepted) > 0:
+                checks += [(key_path, frozenset(accepted))]
+            _compile_checks(accepted, key_path, checks)
+        elif len(accepted) > 0:
+            checks += [(key_path, frozenset(accepted))]
+    return checks
+
+
+def _accepts(value, accepted):
+    try:
+        if isinstance(value, list):
+            return any(e in accepted for e in value)
+        return value in accepted
+    except TypeError:  # unhashable values are never selected
+        return False
+
+
+def compile_filter(filter_dct):
+    # returns a predicate equivalent to filter_entry(entry, filter_dct): fields with
+    # an empty list of values are skipped, fields the entry does not have match,
+    # list fields match if any of their values is accepted
+    checks = _compile_checks(filter_dct, (), [])
+    if len(checks) == 0:
+        return lambda entry: True
+
+    def matches(entry):
+        for path, accepted in checks:
+            value = entry
+            for k in path:
+                if not isinstance(value, dict) or k not in value:
+                    break
+                value = value[k]
+            else:
+                # dicts are checked by the fields of the sub-filter
+                if not isinstance(value, dict) and not _accepts(value, accepted):
+                    return False
+        return True
+
+    return matches
@@ -4,6 +4,12 @@ import re
 import plotly.express as px
 import streamlit as st
 
+from .catalogue_frame import canonical_filter, get_catalogue_frame
+from .catalogue_index import get_catalogue_index
+from .catalogue_search import search_catalogue
+from .catalogue_utils import load_entry_version
+from .language_search import search_languages
+
 entry_type_help = """
 - **Primary source**: a single source of language data (text or speech), such as a newspaper, radio, website, book collection, etc.
 You will be asked to fill in information about the availability of the source, its properties including availability and presence of personal information,
@@ -119,6 +125,26 @@ def make_checkbox(key, label, help="", value=None):
     )
 
 
+def make_language_search(key, label, options, format_func=lambda x: x, help=""):
+    # search-then-select over the BCP-47 languages: only the best matches for the
+    # query are sent to the browser, along with the languages already selected
+    query = make_text_input(
+        key=f"{key}_search",
+        label="Search for a language by name or ISO 639 code:",
+    )
+    if key in st.session_state:
+        st.session_state.save_state[key] = st.session_state[key]
+    selected = st.session_state.save_state.get(key, [])
+    matches = search_languages(options["languages_bcp47"], query) if query else []
+    return make_multiselect(
+        key=key,
+        label=label,
+        options=selected + [x for x in matches if x not in selected],
+        format_func=format_func,
+        help=help,
+    )
+
+
 # Page-specific forms
 def form_general_info_add(entry_dict, options):
     with st.expander("General information", expanded=False):
@@ -172,10 +198,25 @@ def clear_validation_session_state():
 
 def select_entry_val(catalogue, options):
     with st.expander("Select catalogue entry to validate", expanded=False):
+        entry_options = catalogue
+        search_query = st.text_input(
+            label="Search the catalogue by name, description, homepage or custodian:",
+            key="val_entry_search",
+        )
+        if search_query:
+            entry_lists = dict([(e_ls[-1]["uid"], e_ls) for e_ls in catalogue])
+            found_uids = search_catalogue(
+                [e_ls[-1] for e_ls in catalogue], search_query
+            )
+            entry_options = [catalogue[0]] + [entry_lists[uid] for uid in found_uids]
+            # keep the current selection available while the query changes
+            selected = st.session_state.get("val_entry_select")
+            if selected is not None and selected not in entry_options:
+                entry_options.insert(1, selected)
         entry_ls = make_selectbox(
             key="val_entry_select",
             label="Select an entry to validate from the existing catalogue",
-            options=catalogue,
+            options=entry_options,
             format_func=lambda e_ls: f"{e_ls[-1]['uid']} | {e_ls[-1]['description']['name']}",
             on_change=clear_validation_session_state,
         )
@@ -187,6 +228,13 @@ def select_entry_val(catalogue, options):
                 options=entry_ls,
                 format_func=lambda e_dct: e_dct.get("update_time", "original"),
             )
+            loaded_dict = load_entry_version(entry_dict)
+            if loaded_dict is None:
+                st.error(
+                    f"The {entry_dict.get('update_time', 'original')} version of this entry could not be rebuilt from its stored changes, the latest version is loaded instead."
+                )
+                loaded_dict = entry_ls[-1]
+            entry_dict = loaded_dict
         else:
             entry_dict = entry_ls[0]
         st.markdown(
@@ -248,12 +296,10 @@ def form_languages_add(entry_dict, options, countries, region_tree):
             key="add_show_other_languages",
             label="Show other languages",
         ):
-            entry_dict["languages"]["language_names"] += make_multiselect(
+            entry_dict["languages"]["language_names"] += make_language_search(
                 key="add_languages_language_names_other",
                 label="For entries that cover languages outside of the current BigScience list, select all that apply here:",
-                options=[
-                    ", ".join(x["description"]) for x in options["languages_bcp47"]
-                ],
+                options=options,
                 help="This is a comprehensive list of languages obtained from the BCP-47 standard list.",
             )
         st.markdown(
@@ -319,19 +365,92 @@ def form_languages_val(entry_dict, options, countries, region_tree):
         entry_dict["languages"]["validated"] = True
 
 
-def filter_entry(entry, filter_dct):
-    res = True
-    for k, v in entry.items():
-        if k in filter_dct:
-            if isinstance(v, dict):
-                res = res and filter_entry(v, filter_dct[k])
-            elif isinstance(v, list):
-                res = res and (
-                    len(filter_dct[k]) == 0 or any([e in filter_dct[k] for e in v])
-                )
-            else:
-                res = res and (len(filter_dct[k]) == 0 or v in filter_dct[k])
-    return res
+# multiselects of filter_catalogue_visualization: filter_by option -> [(widget key,
+# field path, key of the checkbox that shows the widget if any)]
+viz_filter_fields = {
+    "resource type": [("viz_filter_type", ("type",), None)],
+    "language names": [
+        (
+            "viz_filter_languages_language_names",
+            ("languages", "language_names"),
+            None,
+        ),
+        (
+            "viz_languages_language_names_other",
+            ("languages", "language_names"),
+            "viz_show_other_languages",
+        ),
+    ],
+    "custodian type": [("viz_filter_custodian_type", ("custodian", "type"), None)],
+    "available for download": [
+        (
+            "viz_availability_procurement_for_download",
+            ("availability", "procurement", "for_download"),
+            None,
+        )
+    ],
+    "license type": [
+        (
+            "viz_availability_licensing_license_properties",
+            ("availability", "licensing", "license_properties"),
+            None,
+        ),
+        (
+            "viz_processed_from_primary_primary_license",
+            ("processed_from_primary", "primary_license"),
+            None,
+        ),
+    ],
+    "personally identifying information - pii": [
+        ("viz_availability_pii_has_pii", ("availability", "pii", "has_pii"), None)
+    ],
+    "source type": [
+        (
+            "viz_source_category_category_type",
+            ("source_category", "category_type"),
+            None,
+        ),
+        (
+            "viz_source_category_category_web",
+            ("source_category", "category_web"),
+            None,
+        ),
+        (
+            "viz_source_category_category_media",
+            ("source_category", "category_media"),
+            None,
+        ),
+        (
+            "viz_processed_from_primary_primary_types",
+            ("processed_from_primary", "primary_types"),
+            None,
+        ),
+    ],
+    "media type": [("viz_media_category", ("media", "category"), None)],
+}
+
+
+def get_widget_value(key, default):
+    # value a widget will have in this run, before it is rendered
+    if key in st.session_state:
+        return st.session_state[key]
+    return st.session_state.save_state.get(key, default)
+
+
+def viz_facet_counts(catalogue, filter_by):
+    # counts for each option of the filter multiselects given the other filters,
+    # computed from the selections read ahead from the session state
+    selection = {}
+    for category in filter_by:
+        for key, path, shown_by in viz_filter_fields[category]:
+            selection[path] = selection.get(path, [])
+            if shown_by is None or get_widget_value(shown_by, False):
+                selection[path] = selection[path] + get_widget_value(key, [])
+    return get_catalogue_index(catalogue).facet_counts(selection)
+
+
+def with_count(counts, format_func=lambda x: x):
+    return lambda x: f"{format_func(x)} ({counts.get(x, 0)})"
 
 
 def filter_catalogue_visualization(catalogue, options):
@@ -359,13 +478,16 @@ def filter_catalogue_visualization(catalogue, options):
             label="You can filter the catalogue to only visualize entries that have certain properties, such as:",
             options=filter_by_options,
         )
+        facets = viz_facet_counts(catalogue, filter_by)
         filter_dict = {}
         if "resource type" in filter_by:
             filter_dict["type"] = make_multiselect(
                 key="viz_filter_type",
                 label="I want to only see entries that are of the following category:",
                 options=options["entry_types"],
-                format_func=lambda x: options["entry_types"][x],
+                format_func=with_count(
+                    facets[("type",)], lambda x: options["entry_types"][x]
+                ),
             )
         if "language names" in filter_by:
             filter_dict["languages"] = {}
@@ -375,18 +497,18 @@ def filter_catalogue_visualization(catalogue, options):
                 options=list(options["language_lists"]["language_groups"].keys())
                 + options["language_lists"]["niger_congo_languages"]
                 + options["language_lists"]["indic_languages"],
+                format_func=with_count(facets[("languages", "language_names")]),
             )
             if make_checkbox(
                 key="viz_show_other_languages",
                 label="Show other languages",
             ):
-                filter_dict["languages"]["language_names"] += make_multiselect(
+                filter_dict["languages"]["language_names"] += make_language_search(
                     key="viz_languages_language_names_other",
                     label="For entries that cover languages outside of the current BigScience list, select all that apply here:",
-                    options=[
-                        ", ".join(x["description"]) for x in options["languages_bcp47"]
-                    ],
+                    options=options,
                     help="This is a comprehensive list of languages obtained from the BCP-47 standard list.",
+                    format_func=with_count(facets[("languages", "language_names")]),
                 )
         if "custodian type" in filter_by:
             filter_dict["custodian"] = {}
@@ -394,6 +516,7 @@ def filter_catalogue_visualization(catalogue, options):
                 key="viz_filter_custodian_type",
                 label="I want to only see entries that corresponds to organizations or to data that id owned/managed by organizations of the following types:",
                 options=options["custodian_types"],
+                format_func=with_count(facets[("custodian", "type")]),
             )
         if "available for download" in filter_by:
             filter_dict["availability"] = filter_dict.get("availability", {})
@@ -410,6 +533,9 @@ def filter_catalogue_visualization(catalogue, options):
                 key="viz_availability_procurement_for_download",
                 label="Select based on whether the data can be obtained online:",
                 options=download_options,
+                format_func=with_count(
+                    facets[("availability", "procurement", "for_download")]
+                ),
             )
         if "license type" in filter_by:
             filter_dict["availability"] = filter_dict.get("availability", {})
@@ -428,6 +554,9 @@ def filter_catalogue_visualization(catalogue, options):
                     "non-commercial use",
                     "do not distribute",
                 ],
+                format_func=with_count(
+                    facets[("availability", "licensing", "license_properties")]
+                ),
             )
             primary_license_options = [
                 "Unclear / I don't know",
@@ -443,15 +572,19 @@ def filter_catalogue_visualization(catalogue, options):
                 key="viz_processed_from_primary_primary_license",
                 label="For datasets, selected based on: Is the license or commercial status of the source material compatible with the license of the dataset?",
                 options=primary_license_options,
+                format_func=with_count(
+                    facets[("processed_from_primary", "primary_license")]
+                ),
             )
         if "personally identifying information - pii" in filter_by:
             filter_dict["availability"] = filter_dict.get("availability", {})
             filter_dict["availability"]["pii"] = {}
             filter_dict["availability"]["pii"]["has_pii"] = make_multiselect(
-                key="add_availability_pii_has_pii",
+                key="viz_availability_pii_has_pii",
                 label="Select based on: Does the language data in the resource contain personally identifiable or sensitive information?",
                 help="See the guide for descriptions and examples. The default answer should be 'Yes'. Answers of 'No' and 'Unclear' require justifications.",
                 options=["Yes", "Yes - text author name only", "No", "Unclear"],
+                format_func=with_count(facets[("availability", "pii", "has_pii")]),
             )
         if "source type" in filter_by:
             filter_dict["source_category"] = {}
@@ -459,16 +592,19 @@ def filter_catalogue_visualization(catalogue, options):
                 key="viz_source_category_category_type",
                 label="Select primary sources that correspond to:",
                 options=["collection", "website"],
+                format_func=with_count(facets[("source_category", "category_type")]),
             )
             filter_dict["source_category"]["category_web"] = make_multiselect(
                 key="viz_source_category_category_web",
                 label="Select web-based primary sources that contain:",
                 options=options["primary_taxonomy"]["website"],
+                format_func=with_count(facets[("source_category", "category_web")]),
             )
             filter_dict["source_category"]["category_media"] = make_multiselect(
                 key="viz_source_category_category_media",
                 label="Select primary sources that are collections of:",
                 options=options["primary_taxonomy"]["collection"],
+                format_func=with_count(facets[("source_category", "category_media")]),
             )
             filter_dict["processed_from_primary"] = filter_dict.get(
                 "processed_from_primary", {}
@@ -478,6 +614,9 @@ def filter_catalogue_visualization(catalogue, options):
                 label="Select processed datasets whose primary sources contain:",
                 options=[f"web | {w}" for w in options["primary_taxonomy"]["website"]]
                 + options["primary_taxonomy"]["collection"],
+                format_func=with_count(
+                    facets[("processed_from_primary", "primary_types")]
+                ),
             )
         if "media type" in filter_by:
             filter_dict["media"] = {}
@@ -486,11 +625,12 @@ def filter_catalogue_visualization(catalogue, options):
                 label="Select language data resources that contain:",
                 options=["text", "audiovisual", "image"],
                 help="Media data provided with transcription should go into **text**, then select the *transcribed* option. PDFs that have pre-extracted text information should go into **text**, PDFs that need OCR should go into **images**, select the latter if you're unsure",
+                format_func=with_count(facets[("media", "category")]),
             )
         filtered_catalogue = [
             entry
-            for entry in catalogue
-            if filter_entry(entry, filter_dict) and not (entry["uid"] == "")
+            for entry in get_catalogue_index(catalogue).filter(filter_dict)
+            if not (entry["uid"] == "")
         ]
         left_col, right_col = st.columns([4, 6])
         with left_col:
@@ -504,24 +644,23 @@ def filter_catalogue_visualization(catalogue, options):
                 file_name="filtered_catalogue.json",
             )
         with right_col:
-            lang_counts = dict(
-                [(ln, 0) for ln in options["language_lists"]["language_groups"]]
-            )
-            lang_counts["other"] = 0
-            for entry in filtered_catalogue:
-                other_lang = 1
-                for ln in entry["languages"]["language_names"]:
-                    if ln in lang_counts:
-                        lang_counts[ln] += 1
-                        other_lang = 0
-                lang_counts["other"] += other_lang
+            language_groups = list(options["language_lists"]["language_groups"])
+            catalogue_frame = get_catalogue_frame(catalogue)
+            lang_counts = catalogue_frame.aggregate(
+                ("language_names", canonical_filter(filter_dict), *language_groups),
+                lambda: catalogue_frame.value_counts(
+                    "language_names",
+                    [entry["uid"] for entry in filtered_catalogue],
+                    language_groups,
+                ),
+            )
             fig = px.pie(
                 names=[ln for ln, ct in lang_counts.items()],
                 values=[ct for ln, ct in lang_counts.items()],
                 height=400,
             )
             st.plotly_chart(fig)
-    return filtered_catalogue
+    return filtered_catalogue, filter_dict
 
 
 # Re-usable forms
@@ -0,0 +1,193 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .catalogue_index import catalogue_key
+from .resource_snapshot import get_resource
+
+# list fields exploded into one (entry position, value) row per value, the custodian
+# location is a single value, stored the same way so that both map modes share code
+EXPLODED_FIELDS = {
+    "language_names": ("languages", "language_names"),
+    "language_locations": ("languages", "language_locations"),
+    "custodian_location": ("custodian", "location"),
+}
+
+# frames of the last few catalogues, see get_catalogue_frame
+FRAME_CACHE_SIZE = 4
+# aggregates kept per frame, see CatalogueFrame.aggregate
+AGGREGATE_CACHE_SIZE = 64
+
+_frame_cache = OrderedDict()
+_frame_cache_lock = threading.Lock()
+
+
+def canonical_filter(filter_dct):
+    # hashable form of a filter_dict that does not depend on the order of keys and
+    # values, fields with no selected values are dropped since they match everything
+    items = []
+    for k, v in sorted(filter_dct.items()):
+        if isinstance(v, dict):
+            sub_filter = canonical_filter(v)
+            if len(sub_filter) > 0:
+                items += [(k, sub_filter)]
+        elif len(v) > 0:
+            items += [(k, tuple(sorted(set(v), key=str)))]
+    return tuple(items)
+
+
+def _get_path(entry, path):
+    value = entry
+    for k in path:
+        if not isinstance(value, dict) or k not in value:
+            return None
+        value = value[k]
+    return value
+
+
+class CatalogueFrame:
+    # latest versions of the catalogue entries as columns: `entries` has one row per
+    # entry, `values[field]` one row per (entry position, value) pair of an exploded
+    # field with the values stored as categoricals
+    def __init__(self, catalogue):
+        catalogue = [entry for entry in catalogue if entry["uid"] != ""]
+        self.catalogue = catalogue
+        self.entries = pd.DataFrame(
+            {
+                "uid": [entry["uid"] for entry in catalogue],
+                "type": [entry["type"] for entry in catalogue],
+                "name": [entry["description"]["name"] for entry in catalogue],
+            }
+        )
+        self.uid_index = pd.Index(self.entries["uid"])
+        region_ancestors = get_resource("region_ancestors")
+        self.region_descendants = get_resource("region_descendants")
+        self.values = {}
+        self.missing = {}
+        self._aggregates = OrderedDict()
+        self._aggregates_lock = threading.Lock()
+        for field, path in EXPLODED_FIELDS.items():
+            positions = []
+            values = []
+            specific = []
+            # entries without the field are not filtered out by it, as in filter_entry
+            missing = np.zeros(len(catalogue), dtype=bool)
+            for position, entry in enumerate(catalogue):
+                value = _get_path(entry, path)
+                if value is None:
+                    missing[position] = True
+                    continue
+                value = value if isinstance(value, list) else [value]
+                positions += [position] * len(value)
+                values += value
+                # only the most specific locations of an entry are counted on the map:
+                # regions are dropped when one of their parts is also listed
+                covered = set()
+                for v in value:
+                    covered |= region_ancestors.get(v, set())
+                specific += [v not in covered for v in value]
+            self.values[field] = pd.DataFrame(
+                {
+                    "position": np.array(positions, dtype=np.int64),
+                    "value": pd.Categorical(values),
+                    "specific": np.array(specific, dtype=bool),
+                }
+            )
+            self.missing[field] = missing
+
+    def aggregate(self, key, compute):
+        # memoized compute(), the frame stands for the catalogue version so key only
+        # needs the rest of what the result depends on, e.g. a canonical_filter
+        with self._aggregates_lock:
+            if key in self._aggregates:
+                self._aggregates.move_to_end(key)
+                return self._aggregates[key]
+        value = compute()
+        with self._aggregates_lock:
+            self._aggregates[key] = value
+            while len(self._aggregates) > AGGREGATE_CACHE_SIZE:
+                self._aggregates.popitem(last=False)
+        return value
+
+    def rows(self, uids):
+        # (uid, name, type) rows of the given entries, in the same order
+        rows = self.entries.iloc[self.uid_index.get_indexer(uids)]
+        return rows[["uid", "name", "type"]].reset_index(drop=True)
+
+    def entry(self, uid):
+        return self.catalogue[self.uid_index.get_loc(uid)]
+
+    def selection(self, uids):
+        # boolean mask over the entries
+        positions = self.uid_index.get_indexer(list(uids))
+        mask = np.zeros(len(self.entries), dtype=bool)
+        mask[positions[positions >= 0]] = True
+        return mask
+
+    def _selected_rows(self, field, mask):
+        values = self.values[field]
+        return values[mask[values["position"].to_numpy()]]
+
+    def field_values(self, field, uids):
+        return self._selected_rows(field, self.selection(uids))
+
+    def filter_uids(self, field, uids, accepted, within_regions=False):
+        # uids (of the given ones) that have one of the accepted values for field, or
+        # with within_regions a location inside one of the accepted regions
+        uids = list(uids)
+        if len(accepted) == 0:
+            return uids
+        if within_regions:
+            accepted = set(accepted)
+            for region in list(accepted):
+                accepted |= self.region_descendants.get(region, set())
+            accepted = list(accepted)
+        values = self.values[field]
+        matched = self.missing[field].copy()
+        is_accepted = values["value"].isin(accepted).to_numpy()
+        matched[values["position"].to_numpy()[is_accepted]] = True
+        positions = self.uid_index.get_indexer(uids)
+        keep = (positions >= 0) & matched[positions]
+        return [uid for uid, is_kept in zip(uids, keep) if is_kept]
+
+    def value_counts(self, field, uids, group_values, other="other"):
+        # number of entries for each of group_values, entries that have none of them
+        # are counted under `other`
+        mask = self.selection(uids)
+        rows = self._selected_rows(field, mask)
+        in_group = rows[rows["value"].isin(group_values).to_numpy()]
+        counts = in_group["value"].value_counts()
+        res = {v: int(counts.get(v, 0)) for v in group_values}
+        res[other] = int(mask.sum()) - in_group["position"].nunique()
+        return res
+
+    def location_counts(self, field, uids, fractional=False):
+        # number of entries per location, see `specific` in __init__, with fractional
+        # an entry listing k locations counts for 1/k in each of them
+        rows = self._selected_rows(field, self.selection(uids))
+        rows = rows[rows["specific"].to_numpy()]
+        if not fractional:
+            counts = rows["value"].value_counts()
+            return {loc: int(ct) for loc, ct in counts.items() if ct > 0}
+        positions = rows["position"].to_numpy()
+        weights = 1 / np.bincount(positions)[positions]
+        counts = pd.Series(weights).groupby(rows["value"].to_numpy()).sum()
+        return {loc: round(float(ct), 2) for loc, ct in counts.items() if ct > 0}
+
+
+def get_catalogue_frame(catalogue):
+    # same cache key as get_catalogue_index, the frame and its aggregates stand for the
+    # catalogue version as long as the stores return the same entry dicts
+    key = catalogue_key(catalogue)
+    with _frame_cache_lock:
+        if key in _frame_cache:
+            _frame_cache.move_to_end(key)
+            return _frame_cache[key]
+    frame = CatalogueFrame(list(catalogue))
+    with _frame_cache_lock:
+        _frame_cache[key] = frame
+        while len(_frame_cache) > FRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+    return frame
@@ -0,0 +1,173 @@
+import threading
+from collections import OrderedDict
+
+# field paths indexed up front, other paths used in a filter are indexed on first use
+INDEXED_FIELDS = [
+    ("type",),
+    ("languages", "language_names"),
+    ("languages", "language_locations"),
+    ("custodian", "type"),
+    ("custodian", "location"),
+    ("availability", "procurement", "for_download"),
+    ("availability", "licensing", "license_properties"),
+    ("availability", "pii", "has_pii"),
+    ("source_category", "category_type"),
+    ("source_category", "category_web"),
+    ("source_category", "category_media"),
+    ("processed_from_primary", "primary_license"),
+    ("processed_from_primary", "primary_types"),
+    ("media", "category"),
+]
+
+# indexes of the last few catalogues, see get_catalogue_index
+INDEX_CACHE_SIZE = 4
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def nested_filter(selection):
+    # {field path: list of accepted values} -> nested filter_dict
+    filter_dct = {}
+    for path, values in selection.items():
+        parent = filter_dct
+        for k in path[:-1]:
+            parent = parent.setdefault(k, {})
+        parent[path[-1]] = values
+    return filter_dct
+
+
+def positions_to_bitset(positions, n_positions):
+    bits = bytearray((n_positions + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+def bitset_to_positions(bitset):
+    bits = bin(bitset)[:1:-1]  # least significant bit first
+    positions = []
+    position = bits.find("1")
+    while position != -1:
+        positions += [position]
+        position = bits.find("1", position + 1)
+    return positions
+
+
+class CatalogueIndex:
+    # field path -> value -> bitset of entry positions in the catalogue list
+    # matches filter_entry: an empty value list matches everything, list fields
+    # match if any of their values is accepted, and entries that do not have the
+    # field at all, or have a dict there, are not filtered out by it
+    def __init__(self, catalogue, fields=INDEXED_FIELDS):
+        self.catalogue = catalogue
+        self.all = (1 << len(catalogue)) - 1
+        self.postings = {}
+        self.missing = {}
+        self.nested = {}
+        for path in fields:
+            self._index_field(path)
+
+    def _index_field(self, path):
+        positions = {}
+        missing = []
+        nested = []
+        for position, entry in enumerate(self.catalogue):
+            value = entry
+            for k in path:
+                if not isinstance(value, dict) or k not in value:
+                    missing += [position]
+                    break
+                value = value[k]
+            else:
+                if isinstance(value, dict):
+                    nested += [position]
+                    continue
+                for v in value if isinstance(value, list) else [value]:
+                    try:
+                        positions.setdefault(v, []).append(position)
+                    except TypeError:
+                        pass  # unhashable values can not be selected in a filter
+        n_entries = len(self.catalogue)
+        self.postings[path] = {
+            v: positions_to_bitset(v_positions, n_entries)
+            for v, v_positions in positions.items()
+        }
+        self.missing[path] = positions_to_bitset(missing, n_entries)
+        self.nested[path] = positions_to_bitset(nested, n_entries)
+
+    def match_field(self, path, values):
+        if len(values) == 0:
+            return self.all
+        if path not in self.postings:
+            self._index_field(path)
+        postings = self.postings[path]
+        bitset = self.missing[path] | self.nested[path]
+        for v in values:
+            bitset |= postings.get(v, 0)
+        return bitset
+
+    def match(self, filter_dct, path=()):
+        bitset = self.all
+        for k, v in filter_dct.items():
+            if isinstance(v, dict):
+                # filter_entry checks a plain value found where the filter has a
+                # sub-filter against the keys of the sub-filter
+                bitset &= self.match_field(path + (k,), list(v))
+                bitset &= self.match(v, path + (k,))
+            else:
+                bitset &= self.match_field(path + (k,), v)
+            if bitset == 0:
+                break
+        return bitset
+
+    def facet_counts(self, selection):
+        # selection: {field path: selected values}, for each field path and each of its
+        # values, the number of entries with that value matching the other selections
+        counts = {}
+        for path in selection:
+            others = self.match(
+                nested_filter({p: v for p, v in selection.items() if p != path})
+            )
+            if path not in self.postings:
+                self._index_field(path)
+            counts[path] = {
+                v: bin(others & bitset).count("1")
+                for v, bitset in self.postings[path].items()
+            }
+        return counts
+
+    def value_counts(self, path, bitset):
+        # number of entries in bitset for each value of the field
+        if path not in self.postings:
+            self._index_field(path)
+        counts = {}
+        for v, v_bitset in self.postings[path].items():
+            count = bin(bitset & v_bitset).count("1")
+            if count > 0:
+                counts[v] = count
+        return counts
+
+    def filter(self, filter_dct):
+        return [self.catalogue[i] for i in bitset_to_positions(self.match(filter_dct))]
+
+
+def catalogue_key(catalogue):
+    # entries are shared across reruns by the catalogue stores, so the identity of
+    # the entry dicts tells whether the catalogue changed, except for the "" placeholder
+    # entry which load_catalogue creates anew on every call
+    return tuple("" if entry["uid"] == "" else id(entry) for entry in catalogue)
+
+
+def get_catalogue_index(catalogue):
+    key = catalogue_key(catalogue)
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+    index = CatalogueIndex(list(catalogue))
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,303 @@
+import argparse
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from os.path import getsize, isfile
+from os.path import join as pjoin
+
+from .catalogue_store import (
+    FileCatalogueStore,
+    empty_catalogue,
+    entry_fname,
+    sort_versions,
+    update_time_key,
+)
+
+# start a new segment once the active one grows past this size
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+
+##################
+## Append-only log of entries and validations
+##################
+# Each segment-NNNNNN.jsonl holds one record per line:
+#   {"uid": ..., "update_time": ..., "entry": {...}, "submission": {...}}
+# and segment-NNNNNN.idx holds one [uid, update_time, byte offset] line per record.
+class LogCatalogueStore:
+    def __init__(self, log_dir="catalogue_log"):
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_dir = log_dir
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._entries = {}  # (uid, update_time) -> entry dict
+        self._offsets = {}  # (uid, update_time) -> (segment, byte offset)
+        self._uids = set()
+        self._log_pos = {}  # segment -> bytes of the log already read
+        self._index_pos = {}  # segment -> bytes of the index already read
+
+    def _path(self, segment, ext="jsonl"):
+        return pjoin(self.log_dir, f"segment-{segment:06d}.{ext}")
+
+    def _segments(self):
+        return sorted(
+            int(fname[len("segment-") : -len(".jsonl")])
+            for fname in os.listdir(self.log_dir)
+            if fname.startswith("segment-") and fname.endswith(".jsonl")
+        )
+
+    def _check_segments(self):
+        segments = self._segments()
+        # segments we already read were removed by a compaction in another process
+        if any(segment not in segments for segment in self._log_pos) or any(
+            segment not in segments for segment in self._index_pos
+        ):
+            self._reset()
+        return segments
+
+    @contextmanager
+    def _file_lock(self, mode=fcntl.LOCK_EX):
+        with open(pjoin(self.log_dir, "lock"), "w") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read_lines(path, pos):
+        # only complete lines, a partial last line is still being written
+        with open(path, "rb") as f:
+            f.seek(pos)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        lines = []
+        offset = pos
+        for line in data[:end].splitlines(keepends=True):
+            lines += [(offset, line)]
+            offset += len(line)
+        return lines, pos + end
+
+    def _add_offset(self, uid, update_time, segment, offset):
+        self._offsets[(uid, update_time)] = (segment, offset)
+        self._uids.add(uid)
+
+    def _read_segments(self, read):
+        # compact() in another process can remove a segment between the listing and
+        # the read, the log is then read again from the start under a shared lock, which
+        # compact() cannot take. Callers holding the exclusive lock never get here.
+        try:
+            return read()
+        except FileNotFoundError:
+            with self._file_lock(fcntl.LOCK_SH):
+                self._reset()
+                return read()
+
+    def _update_index(self):
+        self._read_segments(self._read_index)
+
+    def _read_index(self):
+        for segment in self._check_segments():
+            path = self._path(segment, "idx")
+            if not isfile(path):
+                continue
+            lines, self._index_pos[segment] = self._read_lines(
+                path, self._index_pos.get(segment, 0)
+            )
+            for _, line in lines:
+                uid, update_time, offset = json.loads(line)
+                self._add_offset(uid, update_time, segment, offset)
+
+    def _update_entries(self):
+        self._read_segments(self._read_entries)
+
+    def _read_entries(self):
+        for segment in self._check_segments():
+            lines, self._log_pos[segment] = self._read_lines(
+                self._path(segment), self._log_pos.get(segment, 0)
+            )
+            for offset, line in lines:
+                record = json.loads(line)
+                uid, update_time = record["uid"], record["update_time"]
+                entry_dct = record["entry"]
+                if update_time:
+                    entry_dct["update_time"] = update_time
+                entry_dct["fname"] = entry_fname(uid, update_time)
+                self._entries[(uid, update_time)] = entry_dct
+                self._add_offset(uid, update_time, segment, offset)
+
+    def _read_record(self, segment, offset):
+        with open(self._path(segment), "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def load_catalogue(self):
+        with self.lock:
+            self._update_entries()
+            entries = sorted(self._entries.items())
+        catalogue = empty_catalogue()
+        for (uid, update_time), entry_dct in entries:
+            catalogue[uid] = catalogue.get(uid, []) + [entry_dct]
+        return sort_versions(catalogue)
+
+    def load_version(self, entry_dct):
+        return entry_dct
+
+    def has_entry(self, uid):
+        with self.lock:
+            self._update_index()
+            return uid in self._uids
+
+    def get_submission_info(self, uid):
+        with self.lock:
+            return self._read_segments(lambda: self._read_submission(uid))
+
+    def _read_submission(self, uid):
+        self._read_index()
+        # compacted logs may only keep a validated version of the entry
+        update_time = min(t for u, t in self._offsets if u == uid)
+        segment, offset = self._offsets[(uid, update_time)]
+        return self._read_record(segment, offset)["submission"]
+
+    def _append(self, entry_dct, submission_dct, update_time, adding_mode):
+        entry_dct = dict(entry_dct)
+        entry_dct.pop("fname", None)
+        entry_dct.pop("update_time", None)
+        uid = entry_dct["uid"]
+        with self.lock, self._file_lock():
+            self._update_index()
+            if (uid, update_time) in self._offsets or (
+                adding_mode and uid in self._uids
+            ):
+                return False
+            segments = self._segments()
+            segment = segments[-1] if len(segments) > 0 else 1
+            if (
+                isfile(self._path(segment))
+                and getsize(self._path(segment)) > SEGMENT_MAX_BYTES
+            ):
+                segment += 1
+            record = {
+                "uid": uid,
+                "update_time": update_time,
+                "entry": entry_dct,
+                "submission": submission_dct,
+            }
+            offset = self._write_line(self._path(segment), record)
+            self._write_line(self._path(segment, "idx"), [uid, update_time, offset])
+            self._add_offset(uid, update_time, segment, offset)
+        return True
+
+    @staticmethod
+    def _write_line(path, obj):
+        with open(path, "a+b") as f:
+            offset = f.seek(0, os.SEEK_END)
+            if offset > 0:
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    # drop a partial line left behind by a crashed writer
+                    f.seek(0)
+                    offset = f.read().rfind(b"\n") + 1
+                    f.truncate(offset)
+            f.write((json.dumps(obj) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        return offset
+
+    def add_entry(self, entry_dct, submission_dct):
+        return self._append(entry_dct, submission_dct, "", True)
+
+    def add_validated_entry(self, entry_dct, validation_dct, update_time):
+        return self._append(entry_dct, validation_dct, update_time, False)
+
+    def compact(self):
+        with self.lock, self._file_lock():
+            segments = self._segments()
+            latest = {}
+            for segment in segments:
+                with open(self._path(segment), "rb") as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        record = json.loads(line)
+                        uid = record["uid"]
+                        time_key = update_time_key(record["update_time"])
+                        if uid not in latest or time_key > latest[uid][0]:
+                            latest[uid] = (time_key, record)
+            new_segment = segments[-1] + 1 if len(segments) > 0 else 1
+            tmp_log = self._path(new_segment) + ".tmp"
+            tmp_index = self._path(new_segment, "idx") + ".tmp"
+            with open(tmp_log, "wb") as log_f, open(tmp_index, "wb") as index_f:
+                for uid, (_, record) in sorted(latest.items()):
+                    offset = log_f.tell()
+                    log_f.write((json.dumps(record) + "\n").encode("utf-8"))
+                    index_line = json.dumps([uid, record["update_time"], offset])
+                    index_f.write((index_line + "\n").encode("utf-8"))
+                for f in [log_f, index_f]:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_index, self._path(new_segment, "idx"))
+            os.replace(tmp_log, self._path(new_segment))
+            for segment in segments:
+                os.remove(self._path(segment))
+                if isfile(self._path(segment, "idx")):
+                    os.remove(self._path(segment, "idx"))
+            self._reset()
+        return len(latest)
+
+    def import_directories(
+        self, entries_dir="entries", submitted_by_dir="entry_submitted_by", workers=1
+    ):
+        file_store = FileCatalogueStore(
+            entries_dir, submitted_by_dir, workers, "process"
+        )
+        n_imported = 0
+        for entry_ls in file_store.load_catalogue()[1:]:
+            for entry_dct in entry_ls:
+                entry_dct = file_store.load_version(entry_dct)
+                if entry_dct is None:
+                    continue  # delta whose base is missing
+                submission_path = pjoin(
+                    submitted_by_dir,
+                    entry_fname(entry_dct["uid"], entry_dct.get("update_time", "")),
+                )
+                submission_dct = (
+                    json.load(open(submission_path, encoding="utf-8"))
+                    if isfile(submission_path)
+                    else None
+                )
+                n_imported += self._append(
+                    entry_dct,
+                    submission_dct,
+                    entry_dct.get("update_time", ""),
+                    "update_time" not in entry_dct,
+                )
+        return n_imported
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Maintain the append-only JSONL catalogue log"
+    )
+    parser.add_argument("command", choices=["compact", "import"])
+    parser.add_argument("--log_dir", default="catalogue_log")
+    parser.add_argument("--entries_dir", default="entries")
+    parser.add_argument("--submitted_by_dir", default="entry_submitted_by")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    store = LogCatalogueStore(args.log_dir)
+    if args.command == "compact":
+        n_kept = store.compact()
+        print(f"Compacted {args.log_dir} to {n_kept} entries")
+    else:
+        n_imported = store.import_directories(
+            args.entries_dir, args.submitted_by_dir, args.workers
+        )
+        print(f"Imported {n_imported} entry versions into {args.log_dir}")
+
+
+if __name__ == "__main__":
+    main()
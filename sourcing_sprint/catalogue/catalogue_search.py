@@ -0,0 +1,201 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from math import log
+from operator import is_
+
+import numpy as np
+
+# text fields of an entry that the search box looks at
+SEARCH_FIELDS = [
+    ("description", "name"),
+    ("description", "description"),
+    ("description", "homepage"),
+    ("custodian", "name"),
+]
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+SEARCH_TOP_K = 20
+# the last word of a query is also matched as a prefix, on at most this many terms
+MAX_PREFIX_TERMS = 64
+
+
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    return re.findall(r"\w+", text.lower())
+
+
+def _get_path(entry, path):
+    value = entry
+    for k in path:
+        if not isinstance(value, dict) or k not in value:
+            return None
+        value = value[k]
+    return value
+
+
+def entry_terms(entry):
+    return [term for path in SEARCH_FIELDS for term in tokenize(_get_path(entry, path))]
+
+
+class SearchIndex:
+    # BM25 inverted index over the SEARCH_FIELDS of the latest version of each entry
+    # entries are stored in slots, slots of removed entries are reused
+    def __init__(self):
+        self.slots = {}  # uid -> slot
+        self.uids = []  # slot -> uid, None for free slots
+        self.entries = []  # slot -> indexed entry dict, to tell when it was updated
+        self.free_slots = []
+        self.doc_len = np.zeros(0)
+        self.total_len = 0
+        self.postings = {}  # term -> {slot: term frequency}
+        self._packed = {}  # term -> (slots, term frequencies) as arrays
+        self._vocabulary = None  # sorted terms, for prefix matches
+        self._synced = []  # entries of the last sync, to find the ones that changed
+        self._synced_ids = np.zeros(0, dtype=np.int64)
+        self.lock = threading.RLock()
+
+    def add(self, entry):
+        with self.lock:
+            uid = entry["uid"]
+            if uid in self.slots:
+                self.remove(uid)
+            if len(self.free_slots) > 0:
+                slot = self.free_slots.pop()
+            else:
+                slot = len(self.uids)
+                self.uids += [None]
+                self.entries += [None]
+                if slot >= len(self.doc_len):
+                    self.doc_len = np.concatenate(
+                        [self.doc_len, np.zeros(max(len(self.doc_len), 1024))]
+                    )
+            term_counts = Counter(entry_terms(entry))
+            for term, tf in term_counts.items():
+                if term not in self.postings:
+                    self.postings[term] = {}
+                    if self._vocabulary is not None:
+                        insort(self._vocabulary, term)
+                self.postings[term][slot] = tf
+                if term in self._packed:
+                    slots, tfs = self._packed[term]
+                    self._packed[term] = (np.append(slots, slot), np.append(tfs, tf))
+            self.slots[uid] = slot
+            self.uids[slot] = uid
+            self.entries[slot] = entry
+            self.doc_len[slot] = sum(term_counts.values())
+            self.total_len += self.doc_len[slot]
+
+    def remove(self, uid):
+        with self.lock:
+            slot = self.slots.pop(uid)
+            for term in set(entry_terms(self.entries[slot])):
+                postings = self.postings[term]
+                del postings[slot]
+                if len(postings) == 0:
+                    del self.postings[term]
+                    self._packed.pop(term, None)
+                    if self._vocabulary is not None:
+                        del self._vocabulary[bisect_left(self._vocabulary, term)]
+                elif term in self._packed:
+                    slots, tfs = self._packed[term]
+                    self._packed[term] = (slots[slots != slot], tfs[slots != slot])
+            self.total_len -= self.doc_len[slot]
+            self.doc_len[slot] = 0
+            self.uids[slot] = None
+            self.entries[slot] = None
+            self.free_slots += [slot]
+
+    def sync(self, entries):
+        # (re-)index the entries that changed since the last call, the catalogue
+        # stores only create new dicts for the entries that were saved or updated
+        with self.lock:
+            if len(entries) == len(self._synced) and all(
+                map(is_, entries, self._synced)
+            ):
+                return
+            entry_ids = np.fromiter(
+                map(id, entries), dtype=np.int64, count=len(entries)
+            )
+            if len(entry_ids) == len(self._synced_ids):
+                changed = np.flatnonzero(entry_ids != self._synced_ids)
+                new_entries = [entries[i] for i in changed]
+                removed = set(self._synced[i]["uid"] for i in changed)
+                removed -= set(entry["uid"] for entry in new_entries)
+            else:
+                new_entries = entries
+                removed = set(self.slots) - set(entry["uid"] for entry in entries)
+            for uid in removed:
+                if uid in self.slots:
+                    self.remove(uid)
+            for entry in new_entries:
+                slot = self.slots.get(entry["uid"])
+                if entry["uid"] != "" and (
+                    slot is None or self.entries[slot] is not entry
+                ):
+                    self.add(entry)
+            # the entries are kept so that their ids are not reused
+            self._synced = list(entries)
+            self._synced_ids = entry_ids
+
+    def _pack(self, term):
+        if term not in self._packed:
+            postings = self.postings[term]
+            self._packed[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+            )
+        return self._packed[term]
+
+    def _query_terms(self, query):
+        terms = tokenize(query)
+        if len(terms) == 0:
+            return []
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        prefix = terms[-1]
+        start = bisect_left(self._vocabulary, prefix)
+        prefix_terms = []
+        for term in self._vocabulary[start : start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            prefix_terms += [term]
+        return list(dict.fromkeys(terms + prefix_terms))
+
+    def search(self, query, k=SEARCH_TOP_K, uids=None):
+        # uids of the k best matches for query, best first, only among `uids` if given
+        with self.lock:
+            n_docs = len(self.slots)
+            if n_docs == 0:
+                return []
+            avg_len = max(self.total_len / n_docs, 1)
+            scores = np.zeros(len(self.uids))
+            for term in self._query_terms(query):
+                if term not in self.postings:
+                    continue
+                slots, tfs = self._pack(term)
+                idf = log(1 + (n_docs - len(slots) + 0.5) / (len(slots) + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[slots] / avg_len)
+                scores[slots] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+            candidates = np.flatnonzero(scores > 0)
+            if uids is None and len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+            ranked = []
+            for slot in candidates[np.argsort(-scores[candidates], kind="stable")]:
+                if uids is None or self.uids[slot] in uids:
+                    ranked += [self.uids[slot]]
+                    if len(ranked) == k:
+                        break
+            return ranked
+
+
+_search_index = SearchIndex()
+
+
+def search_catalogue(catalogue, query, k=SEARCH_TOP_K, uids=None):
+    # catalogue is the list of the latest version of each entry
+    _search_index.sync(catalogue)
+    return _search_index.search(query, k, uids)
@@ -0,0 +1,725 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from copy import deepcopy
+from datetime import datetime
+from os import scandir
+from os.path import dirname, isdir, isfile
+from os.path import join as pjoin
+
+from .catalogue_watcher import CatalogueWatcher
+from .entry_patch import apply_patch, make_patch
+
+
+def empty_catalogue():
+    return {
+        "": [
+            {
+                "uid": "",
+                "fname": "",
+                "type": "",
+                "description": {
+                    "name": "",
+                    "description": "",
+                },
+            }
+        ]
+    }
+
+
+# update_time of validated versions as the app writes it: 10/16/2021, 09:30:00 becomes
+# 10_16_2021__09_30_00, which does not sort as a string across years
+UPDATE_TIME_FORMAT = "%m_%d_%Y__%H_%M_%S"
+
+
+def update_time_key(update_time):
+    # the original entry ("") and times in another format come first
+    try:
+        return (datetime.strptime(update_time, UPDATE_TIME_FORMAT), update_time)
+    except ValueError:
+        return (datetime.min, update_time)
+
+
+def sort_versions(catalogue):
+    for uid, entry_ls in catalogue.items():
+        if len(entry_ls) > 1:
+            catalogue[uid] = sorted(
+                entry_ls, key=lambda x: update_time_key(x.get("update_time", ""))
+            )
+    return list(catalogue.values())
+
+
+# below this many files a pool costs more than it saves
+PARALLEL_MIN_FILES = 256
+
+
+# validated versions are stored as deltas, with a full copy every CHECKPOINT_INTERVAL
+# versions
+CHECKPOINT_INTERVAL = 8
+DELTA_SUFFIX = ".patch.json"
+
+
+def entry_fname(uid, update_time="", delta=False):
+    if not update_time:
+        return f"{uid}.json"
+    return f"{uid}-validated-{update_time}{DELTA_SUFFIX if delta else '.json'}"
+
+
+def split_entry_fname(fname):
+    stem = fname[: -len(DELTA_SUFFIX)] if fname.endswith(DELTA_SUFFIX) else fname[:-5]
+    uid, _, update_time = stem.partition("-validated-")
+    return uid, update_time
+
+
+# written by the `shard` command, its presence selects the sharded layout:
+# entries/{shard}/{uid}/ holds the original entry and all of its validated versions
+MANIFEST_FNAME = "manifest.json"
+
+
+def shard_name(uid, shard_chars=2):
+    return hashlib.sha1(uid.encode("utf-8")).hexdigest()[:shard_chars]
+
+
+def read_manifest(entries_dir):
+    manifest_path = pjoin(entries_dir, MANIFEST_FNAME)
+    if not isfile(manifest_path):
+        return {"layout": "flat"}
+    return json.load(open(manifest_path, encoding="utf-8"))
+
+
+def clean_entry(entry_dct):
+    return {k: v for k, v in entry_dct.items() if k not in ["fname", "update_time"]}
+
+
+def write_json_atomic(path, obj):
+    # readers either see the previous file or the complete new one
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if isfile(tmp_path):
+            os.remove(tmp_path)
+    dir_fd = os.open(dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def load_entry_file(entry_dir, fname):
+    try:
+        entry_dct = json.load(open(pjoin(entry_dir, fname), encoding="utf-8"))
+    except ValueError:
+        # truncated or partially written file, skipped until it parses
+        return None
+    # delta files hold {"base": fname of the previous version, "patch": [...]}
+    if "-validated-" in fname:
+        entry_dct["update_time"] = split_entry_fname(fname)[1]
+    entry_dct["fname"] = fname
+    return entry_dct
+
+
+def load_entry_files(entry_dirs, fnames, workers=1, executor="thread"):
+    # results are in the order of fnames whatever the number of workers
+    if workers <= 1 or len(fnames) < PARALLEL_MIN_FILES:
+        return [
+            load_entry_file(entry_dir, fname)
+            for entry_dir, fname in zip(entry_dirs, fnames)
+        ]
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    with pool_class(max_workers=workers) as pool:
+        return list(
+            pool.map(
+                load_entry_file,
+                entry_dirs,
+                fnames,
+                chunksize=max(1, len(fnames) // (workers * 4)),
+            )
+        )
+
+
+##################
+## One json file per entry and validated version
+##################
+class FileCatalogueStore:
+    def __init__(
+        self,
+        entries_dir="entries",
+        submitted_by_dir="entry_submitted_by",
+        workers=1,
+        executor="thread",
+    ):
+        self.entries_dir = entries_dir
+        self.submitted_by_dir = submitted_by_dir
+        self.manifest = read_manifest(entries_dir)
+        self.sharded = self.manifest["layout"] == "sharded"
+        # parse in parallel when many files changed at once, e.g. on cold start
+        self.workers = workers
+        self.executor = executor
+        # parsed entry files keyed by file name, re-read only when (mtime, size) changes
+        self._cache = {}
+        self.lock = threading.RLock()
+        # once a watcher is running, only files it reported are looked at again
+        self._watcher = None
+        self._scanned = False
+        self._changes = set()
+        self._changes_lock = threading.Lock()
+        self._submissions = {}
+        # full versions rebuilt from deltas: fname -> (delta dict, full entry dict)
+        self._rebuilt = {}
+
+    def _uid_dir(self, uid):
+        if not self.sharded:
+            return self.entries_dir
+        return pjoin(
+            self.entries_dir, shard_name(uid, self.manifest["shard_chars"]), uid
+        )
+
+    def _entry_path(self, fname):
+        return pjoin(self._uid_dir(split_entry_fname(fname)[0]), fname)
+
+    def _entry_dirs(self):
+        if not self.sharded:
+            return [self.entries_dir]
+        uid_dirs = []
+        with scandir(self.entries_dir) as shard_dirs:
+            for shard_dir in shard_dirs:
+                if shard_dir.is_dir():
+                    with scandir(shard_dir.path) as shard_uid_dirs:
+                        uid_dirs += [d.path for d in shard_uid_dirs if d.is_dir()]
+        return sorted(uid_dirs)
+
+    def watch(self, mode="auto", interval=1.0):
+        self._watcher = CatalogueWatcher(
+            [self.entries_dir, self.submitted_by_dir],
+            self._on_change,
+            mode,
+            interval,
+            recursive=[self.entries_dir] if self.sharded else [],
+        )
+        self._watcher.start()
+        self._scanned = False
+
+    def _on_change(self, directory, fname):
+        with self._changes_lock:
+            self._changes.add((directory, fname))
+
+    def _apply_changes(self):
+        with self._changes_lock:
+            changes, self._changes = self._changes, set()
+        retry = set()
+        for directory, fname in changes:
+            if directory == self.submitted_by_dir:
+                self._submissions.pop(fname, None)
+                continue
+            if not fname.endswith(".json") or fname == MANIFEST_FNAME:
+                continue
+            try:
+                stat = os.stat(self._entry_path(fname))
+            except FileNotFoundError:
+                self._cache.pop(fname, None)
+                continue
+            file_key = (stat.st_mtime_ns, stat.st_size)
+            if fname in self._cache and self._cache[fname][0] == file_key:
+                continue
+            entry_dct = load_entry_file(
+                self._uid_dir(split_entry_fname(fname)[0]), fname
+            )
+            if entry_dct is None:
+                # caught the file mid-write, its next event or call will pick it up
+                retry.add((directory, fname))
+            else:
+                self._cache[fname] = (file_key, entry_dct)
+        with self._changes_lock:
+            self._changes |= retry
+
+    def update_cache(self):
+        with self.lock:
+            if self._watcher is not None and self._scanned:
+                self._apply_changes()
+            else:
+                self._scan()
+                self._scanned = True
+
+    def _scan(self):
+        seen = set()
+        stale = []
+        for entry_dir in self._entry_dirs():
+            with scandir(entry_dir) as dir_entries:
+                for dir_entry in dir_entries:
+                    fname = dir_entry.name
+                    if (
+                        not fname.endswith(".json")
+                        or fname == MANIFEST_FNAME
+                        or not dir_entry.is_file()
+                    ):
+                        continue
+                    seen.add(fname)
+                    stat = dir_entry.stat()
+                    file_key = (stat.st_mtime_ns, stat.st_size)
+                    cached = self._cache.get(fname)
+                    if cached is None or cached[0] != file_key:
+                        stale += [(fname, file_key, entry_dir)]
+        stale = sorted(stale)
+        entry_dcts = load_entry_files(
+            [entry_dir for _, _, entry_dir in stale],
+            [fname for fname, _, _ in stale],
+            self.workers,
+            self.executor,
+        )
+        for (fname, file_key, _), entry_dct in zip(stale, entry_dcts):
+            if entry_dct is not None:
+                self._cache[fname] = (file_key, entry_dct)
+        for fname in [fname for fname in self._cache if fname not in seen]:
+            del self._cache[fname]
+
+    def _current_entries(self):
+        with self.lock:
+            self.update_cache()
+            return {fname: entry_dct for fname, (_, entry_dct) in self._cache.items()}
+
+    def _rebuild(self, entry_dct, entries):
+        # walk back to the last full copy, then apply the deltas forward
+        chain = []
+        while entry_dct is not None and "patch" in entry_dct:
+            chain += [entry_dct]
+            entry_dct = entries.get(entry_dct.get("base"))
+        if entry_dct is None:
+            return None
+        full_dct = deepcopy(clean_entry(entry_dct))
+        try:
+            for delta_dct in reversed(chain):
+                apply_patch(full_dct, delta_dct["patch"])
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None  # patch that does not apply to its base
+        if len(chain) > 0:
+            full_dct["update_time"] = chain[0]["update_time"]
+            full_dct["fname"] = chain[0]["fname"]
+        return full_dct
+
+    def _has_base(self, entry_dct, entries, checked):
+        # whether the deltas lead back to a full copy, checked maps fname -> result
+        chain = []
+        while (
+            entry_dct is not None
+            and "patch" in entry_dct
+            and entry_dct["fname"] not in checked
+        ):
+            if entry_dct["fname"] in chain:
+                entry_dct = None  # deltas based on each other
+                break
+            chain += [entry_dct["fname"]]
+            entry_dct = entries.get(entry_dct.get("base"))
+        has_base = entry_dct is not None and checked.get(entry_dct["fname"], True)
+        for fname in chain:
+            checked[fname] = has_base
+        return has_base
+
+    def _load_version(self, entry_dct, entries):
+        if "patch" not in entry_dct:
+            return entry_dct
+        rebuilt = self._rebuilt.get(entry_dct["fname"])
+        if rebuilt is None or rebuilt[0] is not entry_dct:
+            rebuilt = (entry_dct, self._rebuild(entry_dct, entries))
+            self._rebuilt[entry_dct["fname"]] = rebuilt
+        return rebuilt[1]
+
+    def load_version(self, entry_dct):
+        # older validated versions are listed as deltas until they are selected
+        with self.lock:
+            return self._load_version(entry_dct, self._current_entries())
+
+    def load_catalogue(self):
+        # _rebuilt is shared by the sessions of the app, it is only used under the lock
+        with self.lock:
+            entries = self._current_entries()
+            catalogue = empty_catalogue()
+            fnames = sorted(entries)
+            for fname in fnames:
+                if not "-validated-" in fname:
+                    entry_dct = entries[fname]
+                    catalogue[entry_dct["uid"]] = [entry_dct]
+            for fname in fnames:
+                if "-validated-" in fname:
+                    uid = split_entry_fname(fname)[0]
+                    if uid in catalogue:
+                        catalogue[uid] += [entries[fname]]
+            catalogue = sort_versions(catalogue)
+            # versions are only listed if they can be rebuilt: a delta whose base was
+            # removed or could not be parsed breaks every later delta of its chain
+            checked = {}
+            for entry_ls in catalogue:
+                entry_ls[1:] = [
+                    entry_dct
+                    for entry_dct in entry_ls[1:]
+                    if self._has_base(entry_dct, entries, checked)
+                ]
+            # only the latest version of each entry is rebuilt
+            for entry_ls in catalogue:
+                while (
+                    len(entry_ls) > 1
+                    and self._load_version(entry_ls[-1], entries) is None
+                ):
+                    entry_ls.pop()  # delta whose patch does not apply
+                entry_ls[-1] = self._load_version(entry_ls[-1], entries)
+            latest = set(entry_ls[-1]["fname"] for entry_ls in catalogue)
+            self._rebuilt = {
+                fname: rebuilt
+                for fname, rebuilt in self._rebuilt.items()
+                if fname in latest
+            }
+        return catalogue
+
+    def has_entry(self, uid):
+        return isfile(self._entry_path(entry_fname(uid)))
+
+    def has_version(self, uid, update_time):
+        return isfile(self._entry_path(entry_fname(uid, update_time))) or isfile(
+            self._entry_path(entry_fname(uid, update_time, delta=True))
+        )
+
+    def get_versions(self, uid):
+        if self.sharded:
+            # a single directory listing in the sharded layout
+            uid_dir = self._uid_dir(uid)
+            fnames = os.listdir(uid_dir) if isdir(uid_dir) else []
+        else:
+            # the flat layout would need a listing of all entries, use the cache
+            fnames = self._current_entries()
+        return sorted(
+            (
+                update_time
+                for version_uid, update_time in [
+                    split_entry_fname(fname)
+                    for fname in fnames
+                    if fname.endswith(".json") and fname != MANIFEST_FNAME
+                ]
+                if version_uid == uid
+            ),
+            key=update_time_key,
+        )
+
+    def get_submission_info(self, uid):
+        fname = entry_fname(uid)
+        if self._watcher is None:
+            return json.load(
+                open(pjoin(self.submitted_by_dir, fname), encoding="utf-8")
+            )
+        with self.lock:
+            self._apply_changes()
+            if fname not in self._submissions:
+                self._submissions[fname] = json.load(
+                    open(pjoin(self.submitted_by_dir, fname), encoding="utf-8")
+                )
+            # callers fill in the validation fields
+            return dict(self._submissions[fname])
+
+    @contextmanager
+    def _reserve(self, uid):
+        # flock on a lock file: only one writer at a time per uid, across processes.
+        # the lock goes away with its holder, a crashed writer leaves no stale lock.
+        # yields None if another writer holds it
+        # kept out of the uid directory, which is only created once there is a file
+        lock_path = pjoin(self.entries_dir, f"{uid}.lock")
+        while True:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_WRONLY)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(lock_fd)
+                yield None
+                return
+            # the previous holder removes the file before unlocking it, a lock taken
+            # on a removed file does not exclude anyone, try again on the new one
+            try:
+                lock_stat = os.stat(lock_path)
+            except FileNotFoundError:
+                lock_stat = None
+            fd_stat = os.fstat(lock_fd)
+            if lock_stat is not None and (lock_stat.st_dev, lock_stat.st_ino) == (
+                fd_stat.st_dev,
+                fd_stat.st_ino,
+            ):
+                break
+            os.close(lock_fd)
+        try:
+            yield True
+        finally:
+            os.remove(lock_path)
+            os.close(lock_fd)
+
+    def add_entry(self, entry_dct, submission_dct):
+        fname = entry_fname(entry_dct["uid"])
+        with self._reserve(entry_dct["uid"]) as reserved:
+            if reserved is None:
+                return None  # another session is saving this uid
+            if self.has_entry(entry_dct["uid"]):
+                return False
+            self._write(entry_dct, submission_dct, fname)
+        return True
+
+    def add_validated_entry(self, entry_dct, validation_dct, update_time):
+        uid = entry_dct["uid"]
+        fname = entry_fname(uid, update_time)
+        delta_fname = entry_fname(uid, update_time, delta=True)
+        with self._reserve(uid) as reserved:
+            if reserved is None:
+                return None  # another session is saving this uid
+            if self.has_version(uid, update_time):
+                return False
+            with self.lock:
+                entries = self._current_entries()
+                versions = [
+                    entries[version_fname]
+                    for version_fname in sorted(entries)
+                    if split_entry_fname(version_fname)[0] == uid
+                ]
+                versions = sorted(
+                    versions, key=lambda x: update_time_key(x.get("update_time", ""))
+                )
+                n_deltas = 0
+                while n_deltas < len(versions) and "patch" in versions[-1 - n_deltas]:
+                    n_deltas += 1
+                previous = (
+                    self._load_version(versions[-1], entries)
+                    if len(versions) > 0
+                    else None
+                )
+            if previous is None or n_deltas + 1 >= CHECKPOINT_INTERVAL:
+                self._write(entry_dct, validation_dct, fname)
+            else:
+                delta_dct = {
+                    "base": previous["fname"],
+                    "patch": make_patch(clean_entry(previous), clean_entry(entry_dct)),
+                }
+                self._write(delta_dct, validation_dct, fname, delta_fname)
+        return True
+
+    def _write(self, entry_dct, submission_dct, fname, entry_file_name=None):
+        # the entry file is written last so that listed entries always have a submitter
+        write_json_atomic(pjoin(self.submitted_by_dir, fname), submission_dct)
+        entry_path = self._entry_path(entry_file_name or fname)
+        os.makedirs(dirname(entry_path), exist_ok=True)
+        write_json_atomic(entry_path, entry_dct)
+        # our own writes are visible right away, without waiting for the watcher
+        self._on_change(self.submitted_by_dir, fname)
+        self._on_change(self.entries_dir, entry_file_name or fname)
+
+
+def shard_entries_dir(entries_dir="entries", shard_chars=2):
+    # moves a flat entries/ directory to the sharded layout, run with the app stopped
+    if read_manifest(entries_dir)["layout"] == "sharded":
+        return 0
+    n_moved = 0
+    for fname in sorted(os.listdir(entries_dir)):
+        if not fname.endswith(".json") or not isfile(pjoin(entries_dir, fname)):
+            continue
+        uid = split_entry_fname(fname)[0]
+        uid_dir = pjoin(entries_dir, shard_name(uid, shard_chars), uid)
+        os.makedirs(uid_dir, exist_ok=True)
+        os.rename(pjoin(entries_dir, fname), pjoin(uid_dir, fname))
+        n_moved += 1
+    write_json_atomic(
+        pjoin(entries_dir, MANIFEST_FNAME),
+        {"layout": "sharded", "shard_chars": shard_chars},
+    )
+    return n_moved
+
+
+##################
+## SQLite database, one row per entry version
+##################
+# the DROP statements remove the per-field indexes of earlier databases: the explorer
+# filters the loaded catalogue in memory (get_catalogue_index), nothing queried them
+CATALOGUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL,
+    update_time TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    UNIQUE (uid, update_time)
+);
+CREATE TABLE IF NOT EXISTS entry_submitted_by (
+    uid TEXT NOT NULL,
+    update_time TEXT NOT NULL,
+    info TEXT NOT NULL,
+    PRIMARY KEY (uid, update_time)
+);
+DROP INDEX IF EXISTS entries_type;
+DROP INDEX IF EXISTS entries_custodian_type;
+DROP INDEX IF EXISTS entries_custodian_location;
+DROP TABLE IF EXISTS entry_language_names;
+DROP TABLE IF EXISTS entry_language_locations;
+"""
+
+
+class CatalogueStore:
+    def __init__(self, db_path="catalogue.db"):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(CATALOGUE_SCHEMA)
+        # parsed rows keyed by (uid, update_time), rows with seq > _last_seq are new
+        self._cache = {}
+        self._last_seq = 0
+
+    def _insert(self, entry_dct, submission_dct, update_time, replace=False):
+        if replace:
+            self.conn.execute(
+                "DELETE FROM entries WHERE uid = ? AND update_time = ?",
+                (entry_dct["uid"], update_time),
+            )
+        entry_dct = dict(entry_dct)
+        entry_dct.pop("fname", None)
+        entry_dct.pop("update_time", None)
+        self.conn.execute(
+            "INSERT INTO entries (uid, update_time, entry) VALUES (?, ?, ?)",
+            (entry_dct["uid"], update_time, json.dumps(entry_dct)),
+        )
+        if submission_dct is not None:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entry_submitted_by (uid, update_time, info) VALUES (?, ?, ?)",
+                (entry_dct["uid"], update_time, json.dumps(submission_dct)),
+            )
+
+    def load_catalogue(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, uid, update_time, entry FROM entries WHERE seq > ? ORDER BY seq",
+                (self._last_seq,),
+            ).fetchall()
+            # _cache is shared by the sessions of the app, it is only used under the lock
+            for seq, uid, update_time, entry in rows:
+                entry_dct = json.loads(entry)
+                if update_time:
+                    entry_dct["update_time"] = update_time
+                entry_dct["fname"] = entry_fname(uid, update_time)
+                self._cache[(uid, update_time)] = entry_dct
+                self._last_seq = max(self._last_seq, seq)
+            catalogue = empty_catalogue()
+            for (uid, update_time), entry_dct in sorted(self._cache.items()):
+                if update_time == "":
+                    catalogue[uid] = [entry_dct]
+                elif uid in catalogue:
+                    catalogue[uid] += [entry_dct]
+        return sort_versions(catalogue)
+
+    def load_version(self, entry_dct):
+        return entry_dct
+
+    def has_entry(self, uid):
+        with self.lock:
+            return (
+                self.conn.execute(
+                    "SELECT 1 FROM entries WHERE uid = ? AND update_time = '' LIMIT 1",
+                    (uid,),
+                ).fetchone()
+                is not None
+            )
+
+    def get_versions(self, uid):
+        with self.lock:
+            return sorted(
+                (
+                    update_time
+                    for (update_time,) in self.conn.execute(
+                        "SELECT update_time FROM entries WHERE uid = ?", (uid,)
+                    )
+                ),
+                key=update_time_key,
+            )
+
+    def get_submission_info(self, uid):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT info FROM entry_submitted_by WHERE uid = ? AND update_time = ''",
+                (uid,),
+            ).fetchone()
+        return json.loads(row[0])
+
+    def add_entry(self, entry_dct, submission_dct):
+        with self.lock:
+            try:
+                with self.conn:
+                    self._insert(entry_dct, submission_dct, "")
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def add_validated_entry(self, entry_dct, validation_dct, update_time):
+        with self.lock:
+            try:
+                with self.conn:
+                    self._insert(entry_dct, validation_dct, update_time)
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def import_directories(
+        self, entries_dir="entries", submitted_by_dir="entry_submitted_by", workers=1
+    ):
+        file_store = FileCatalogueStore(
+            entries_dir, submitted_by_dir, workers, "process"
+        )
+        n_imported = 0
+        with self.lock, self.conn:
+            for entry_ls in file_store.load_catalogue()[1:]:
+                for entry_dct in entry_ls:
+                    entry_dct = file_store.load_version(entry_dct)
+                    if entry_dct is None:
+                        continue  # delta whose base is missing
+                    submission_path = pjoin(
+                        submitted_by_dir,
+                        entry_fname(entry_dct["uid"], entry_dct.get("update_time", "")),
+                    )
+                    submission_dct = (
+                        json.load(open(submission_path, encoding="utf-8"))
+                        if isfile(submission_path)
+                        else None
+                    )
+                    self._insert(
+                        entry_dct,
+                        submission_dct,
+                        entry_dct.get("update_time", ""),
+                        replace=True,
+                    )
+                    n_imported += 1
+        return n_imported
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import the entries/ and entry_submitted_by/ directories into a SQLite catalogue, or move entries/ to the sharded layout"
+    )
+    parser.add_argument("command", choices=["import", "shard"])
+    parser.add_argument("--db", default="catalogue.db")
+    parser.add_argument("--entries_dir", default="entries")
+    parser.add_argument("--submitted_by_dir", default="entry_submitted_by")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard_chars", type=int, default=2)
+    args = parser.parse_args()
+    if args.command == "import":
+        n_imported = CatalogueStore(args.db).import_directories(
+            args.entries_dir, args.submitted_by_dir, args.workers
+        )
+        print(f"Imported {n_imported} entry versions into {args.db}")
+    else:
+        n_moved = shard_entries_dir(args.entries_dir, args.shard_chars)
+        print(
+            f"Moved {n_moved} entry files to the sharded layout in {args.entries_dir}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,155 @@
 import json
-from glob import glob
-from os.path import isfile
-from os.path import join as pjoin
+import os
+import threading
+from collections.abc import Mapping
 
-import streamlit as st
+from .catalogue_log import LogCatalogueStore
+from .catalogue_store import CatalogueStore, FileCatalogueStore
+from .resource_snapshot import get_resource
 
-app_categories = {
-    "entry_types": {
-        "primary": "Primary source",
-        "processed": "Processed language dataset",
-        "organization": "Language organization or advocate",
+
+class LazyCategories(Mapping):
+    # values in `loaders` are only computed, then memoized, on first access: listing
+    # or testing the keys loads nothing, reading the values loads them all
+    def __init__(self, values, loaders):
+        self._values = dict(values)
+        self.loaders = loaders
+        self._keys = list(self._values) + [k for k in loaders if k not in self._values]
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if key not in self.loaders:
+                raise KeyError(key)
+            self._values[key] = self.loaders[key]()
+        return self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values or key in self.loaders
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+app_categories = LazyCategories(
+    {
+        "entry_types": {
+            "primary": "Primary source",
+            "processed": "Processed language dataset",
+            "organization": "Language organization or advocate",
+        },
+        #
+        "language_lists": get_resource("language_lists"),
+        #
+        "custodian_types": [
+            "A private individual",
+            "A commercial entity",
+            "A library, museum, or archival institute",
+            "A university or research institution",
+            "A nonprofit/NGO (other)",
+            "A government organization",
+        ],
+        "pii_categories": get_resource("pii_categories"),
+        "licenses": get_resource("licenses"),
+        "primary_taxonomy": get_resource("primary_taxonomy"),
+        "file_formats": get_resource("file_formats"),
     },
-    #
-    "language_lists": json.load(
-        open("resources/language_lists.json", encoding="utf-8")
-    ),
-    "programming_languages": [
-        x
-        for x in json.load(
-            open("resources/programming_languages.json", encoding="utf-8")
-        )["itemListElement"]
-    ],
-    "languages_bcp47": [
-        x
-        for x in json.load(open("resources/bcp47.json", encoding="utf-8"))["subtags"]
-        if x["type"] == "language"
-    ],
-    #
-    "custodian_types": [
-        "A private individual",
-        "A commercial entity",
-        "A library, museum, or archival institute",
-        "A university or research institution",
-        "A nonprofit/NGO (other)",
-        "A government organization",
-    ],
-    "pii_categories": json.load(
-        open("resources/pii_categories.json", encoding="utf-8")
-    ),
-    "licenses": json.load(open("resources/licenses.json", encoding="utf-8")),
-    "primary_taxonomy": json.load(
-        open("resources/primary_source_taxonomy.json", encoding="utf-8")
-    ),
-    "file_formats": json.load(open("resources/file_formats.json", encoding="utf-8")),
-}
+    # large vocabularies only needed by some widgets
+    loaders={
+        "programming_languages": lambda: get_resource("programming_languages"),
+        "languages_bcp47": lambda: get_resource("languages_bcp47"),
+    },
+)
 
 
-def load_catalogue():
-    catalogue_list = [
-        (fname.split("/")[-1], json.load(open(fname, encoding="utf-8")))
-        for fname in glob("entries/*.json")
-        if not "-validated-" in fname
-    ]
-    for fname, dct in catalogue_list:
-        dct["fname"] = fname
-    catalogue = dict(
-        [
-            (
-                "",
-                [
-                    {
-                        "uid": "",
-                        "fname": "",
-                        "type": "",
-                        "description": {
-                            "name": "",
-                            "description": "",
-                        },
-                    }
-                ],
+# "files" keeps one json file per entry version in entries/, "sqlite" uses CATALOGUE_DB,
+# "jsonl" appends to the segmented log in CATALOGUE_LOG_DIR
+CATALOGUE_BACKEND = os.environ.get("CATALOGUE_BACKEND", "files")
+CATALOGUE_DB = os.environ.get("CATALOGUE_DB", "catalogue.db")
+CATALOGUE_LOG_DIR = os.environ.get("CATALOGUE_LOG_DIR", "catalogue_log")
+# worker pool used by the "files" backend to parse many entries at once
+CATALOGUE_LOAD_WORKERS = int(os.environ.get("CATALOGUE_LOAD_WORKERS", 1))
+CATALOGUE_LOAD_EXECUTOR = os.environ.get("CATALOGUE_LOAD_EXECUTOR", "thread")
+# "auto", "inotify" or "poll" to follow other workers' writes to entries/, "off" to rescan
+CATALOGUE_WATCH = os.environ.get("CATALOGUE_WATCH", "auto")
+CATALOGUE_WATCH_INTERVAL = float(os.environ.get("CATALOGUE_WATCH_INTERVAL", 1.0))
+
+_catalogue_store = None
+_catalogue_store_lock = threading.Lock()
+
+
+def get_catalogue_store():
+    global _catalogue_store
+    with _catalogue_store_lock:
+        if _catalogue_store is not None:
+            return _catalogue_store
+        if CATALOGUE_BACKEND == "sqlite":
+            _catalogue_store = CatalogueStore(CATALOGUE_DB)
+        elif CATALOGUE_BACKEND == "jsonl":
+            _catalogue_store = LogCatalogueStore(CATALOGUE_LOG_DIR)
+        else:
+            _catalogue_store = FileCatalogueStore(
+                "entries",
+                "entry_submitted_by",
+                CATALOGUE_LOAD_WORKERS,
+                CATALOGUE_LOAD_EXECUTOR,
             )
-        ]
-        + [(dct["uid"], [dct]) for _, dct in catalogue_list]
+            if CATALOGUE_WATCH != "off":
+                _catalogue_store.watch(CATALOGUE_WATCH, CATALOGUE_WATCH_INTERVAL)
+    return _catalogue_store
+
+
+def load_catalogue():
+    return get_catalogue_store().load_catalogue()
+
+
+def load_entry_version(entry_dct):
+    return get_catalogue_store().load_version(entry_dct)
+
+
+def get_submission_info(uid):
+    return get_catalogue_store().get_submission_info(uid)
+
+
+def uid_taken_message(uid):
+    return f"There is already an entry with `uid` {uid}, you need to give your entry a different one before saving. You can look at the entry with this `uid` by switching to the **Validate an existing entry** mode of this app in the left sidebar."
+
+
+def save_in_progress_message(uid):
+    return f"Another version of `{uid}` is being saved right now, please try again in a moment."
+
+
+def save_entry(entry_dct, submission_dct):
+    # the file store returns None while another session is saving the same uid
+    saved = get_catalogue_store().add_entry(entry_dct, submission_dct)
+    if saved is None:
+        return False, save_in_progress_message(entry_dct["uid"])
+    if saved:
+        return True, ""
+    return False, uid_taken_message(entry_dct["uid"])
+
+
+def save_validated_entry(entry_dct, validation_dct, update_time):
+    saved = get_catalogue_store().add_validated_entry(
+        entry_dct, validation_dct, update_time
+    )
+    if saved is None:
+        return False, save_in_progress_message(entry_dct["uid"])
+    if saved:
+        return True, ""
+    return (
+        False,
+        f"A validated version of `{entry_dct['uid']}` was already saved at {update_time}, please try again.",
     )
-    for fname in glob("entries/*-validated-*.json"):
-        uid, date_str = fname.split("/")[-1][:-5].split("-validated-")
-        entry_dct = json.load(open(fname, encoding="utf-8"))
-        entry_dct["update_time"] = date_str
-        entry_dct["fname"] = fname.split("/")[-1]
-        catalogue[uid] += [entry_dct]
-        catalogue[uid] = sorted(
-            catalogue[uid], key=lambda x: x.get("update_time", "00")
-        )
-    return list(catalogue.values())
 
 
 def can_save(entry_dct, submission_dct, adding_mode):
     if adding_mode and (
-        entry_dct["uid"] == "" or isfile(pjoin("entries", f"{entry_dct['uid']}.json"))
+        entry_dct["uid"] == "" or get_catalogue_store().has_entry(entry_dct["uid"])
     ):
-        return (
-            False,
-            f"There is already an entry with `uid` {entry_dct['uid']}, you need to give your entry a different one before saving. You can look at the entry with this `uid` by switching to the **Validate an existing entry** mode of this app in the left sidebar.",
-        )
+        return False, uid_taken_message(entry_dct["uid"])
     if adding_mode and (
         submission_dct["submitted_by"] == "" or submission_dct["submitted_email"] == ""
     ):
@@ -0,0 +1,101 @@
+import threading
+from os import scandir
+from os.path import basename
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+def scan_directory(directory, recursive=False):
+    file_keys = {}
+    with scandir(directory) as dir_entries:
+        for dir_entry in dir_entries:
+            if dir_entry.is_file():
+                stat = dir_entry.stat()
+                file_keys[dir_entry.name] = (stat.st_mtime_ns, stat.st_size)
+            elif recursive and dir_entry.is_dir():
+                file_keys.update(scan_directory(dir_entry.path, recursive))
+    return file_keys
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, directory, callback):
+        super().__init__()
+        self.directory = directory
+        self.callback = callback
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in [event.src_path, getattr(event, "dest_path", "")]:
+            if path:
+                self.callback(self.directory, basename(path))
+
+
+class CatalogueWatcher:
+    # calls callback(directory, fname) for every file added, changed or removed
+    # mode "inotify" needs the watchdog package, "poll" compares (mtime, size)
+    # snapshots every interval seconds and also sees writes from other hosts on
+    # network filesystems, "auto" uses inotify when available
+    def __init__(self, directories, callback, mode="auto", interval=1.0, recursive=()):
+        self.directories = directories
+        # directories in `recursive` also report files in their subdirectories
+        self.recursive = recursive
+        self.callback = callback
+        self.mode = "poll" if mode == "auto" and Observer is None else mode
+        if self.mode == "auto":
+            self.mode = "inotify"
+        if self.mode == "inotify" and Observer is None:
+            raise ImportError(
+                "CatalogueWatcher mode 'inotify' requires the watchdog package"
+            )
+        self.interval = interval
+        self._observer = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.mode == "inotify":
+            self._observer = Observer()
+            for directory in self.directories:
+                self._observer.schedule(
+                    _ChangeHandler(directory, self.callback),
+                    directory,
+                    recursive=directory in self.recursive,
+                )
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            snapshots = {
+                directory: scan_directory(directory, directory in self.recursive)
+                for directory in self.directories
+            }
+            self._thread = threading.Thread(
+                target=self._poll, args=(snapshots,), daemon=True
+            )
+            self._thread.start()
+
+    def _poll(self, snapshots):
+        while not self._stop.wait(self.interval):
+            for directory in self.directories:
+                try:
+                    file_keys = scan_directory(directory, directory in self.recursive)
+                except OSError:
+                    continue
+                previous = snapshots[directory]
+                for fname in file_keys.keys() | previous.keys():
+                    if file_keys.get(fname) != previous.get(fname):
+                        self.callback(directory, fname)
+                snapshots[directory] = file_keys
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
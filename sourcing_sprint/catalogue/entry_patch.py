@@ -0,0 +1,44 @@
+from copy import deepcopy
+
+# JSON patch (RFC 6902) between two entry dicts: nested dicts are diffed key by
+# key, lists and other values are replaced whole
+
+
+def _escape(key):
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(key):
+    return key.replace("~1", "/").replace("~0", "~")
+
+
+def make_patch(old, new, path=""):
+    patch = []
+    for key in old:
+        if key not in new:
+            patch += [{"op": "remove", "path": f"{path}/{_escape(key)}"}]
+    for key, value in new.items():
+        key_path = f"{path}/{_escape(key)}"
+        if key not in old:
+            patch += [{"op": "add", "path": key_path, "value": deepcopy(value)}]
+        elif isinstance(old[key], dict) and isinstance(value, dict):
+            patch += make_patch(old[key], value, key_path)
+        elif old[key] != value or type(old[key]) != type(value):
+            patch += [{"op": "replace", "path": key_path, "value": deepcopy(value)}]
+    return patch
+
+
+def apply_patch(doc, patch):
+    # modifies doc in place
+    for operation in patch:
+        *parents, key = [_unescape(part) for part in operation["path"].split("/")[1:]]
+        target = doc
+        for parent in parents:
+            target = target[parent]
+        if operation["op"] == "remove":
+            del target[key]
+        elif operation["op"] in ["add", "replace"]:
+            target[key] = deepcopy(operation["value"])
+        else:
+            raise ValueError(f"Unsupported patch operation: {operation['op']}")
+    return doc
@@ -1,20 +1,66 @@
+import hashlib
 import json
+import threading
+from collections import OrderedDict
+from os.path import join as pjoin
 
 import folium
+import numpy as np
 import pandas as pd
 from folium import Marker
 from folium.plugins import MarkerCluster
 from jinja2 import Template
+from scipy import sparse
+
+from .resource_snapshot import RESOURCES_DIR, get_resource
+from .world_outlines import get_world_outlines
+
+regions = get_resource("regions")
+countries = get_resource("countries")
+region_tree = get_resource("region_tree")
+region_ancestors = get_resource("region_ancestors")
+region_descendants = get_resource("region_descendants")
+region_countries = get_resource("region_countries")
+location_centers = get_resource("location_centers")
+country_centers = get_resource("country_centers")
+country_mappings = get_resource("country_mappings")
+
+
+def location_outline_matrix():
+    # sparse (outline x location) matrix counting how many times a location is
+    # counted on each country outline, regions are counted on all of their countries
+    to_outline = country_mappings["to_outline"]
+    locations = list(
+        dict.fromkeys(
+            list(region_tree)
+            + countries
+            + list(location_centers)
+            + list(to_outline)
+            + list(to_outline.values())
+        )
+    )
+    outlines = {}
+    rows = []
+    columns = []
+    for col, name in enumerate(locations):
+        for country in region_countries[name] if name in region_tree else [name]:
+            outline = to_outline.get(country, country)
+            rows += [outlines.setdefault(outline, len(outlines))]
+            columns += [col]
+    # repeated (row, column) pairs are summed
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, columns)), shape=(len(outlines), len(locations))
+    )
+    return {name: col for col, name in enumerate(locations)}, list(outlines), matrix
 
-regions, countries, region_tree = json.load(
-    open("resources/country_regions.json", encoding="utf-8")
-)
-country_centers = json.load(
-    open("resources/country_center_coordinates.json", encoding="utf-8")
-)
-country_mappings = json.load(open("resources/country_mappings.json", encoding="utf-8"))
 
-WORLD_GEO_URL = "https://raw.githubusercontent.com/python-visualization/folium/master/examples/data/world-countries.json"
+map_locations, map_outlines, location_outlines = location_outline_matrix()
+
+# rendered maps of the last few resource_counts, see render_choro_map
+MAP_CACHE_SIZE = 32
+
+_map_cache = OrderedDict()
+_map_cache_lock = threading.Lock()
 
 ICON_CREATE_FUNCTIOM = """
     function(cluster) {
@@ -33,6 +79,145 @@ ICON_CREATE_FUNCTIOM = """
 """
 
 
+# map mode where the location kind and entry types are picked in the browser, the
+# entry locations are sent once per catalogue version, see render_client_map
+CLIENT_MAP_FIELDS = {
+    "custodian_location": "Where the organizations or data custodians are located",
+    "language_locations": "Where the language data creators are located",
+}
+# PuRd, as the folium choropleth
+CLIENT_MAP_COLORS = ["#f1eef6", "#d4b9da", "#c994c7", "#df65b0", "#dd1c77", "#980043"]
+
+# Leaflet 1.9.3, BSD-2-Clause, see resources/leaflet/LICENSE
+LEAFLET_DIR = pjoin(RESOURCES_DIR, "leaflet")
+_leaflet_assets = {}
+_leaflet_lock = threading.Lock()
+# replaced by the positions of the entries matching the filters
+CLIENT_MAP_ALL_SHOWN = "var shown = null;"
+
+CLIENT_MAP_TEMPLATE = Template(
+    """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+{{ leaflet_css }}
+</style>
+<script>
+{{ leaflet_js }}
+</script>
+<style>
+    html, body { margin: 0; font-family: sans-serif; font-size: 14px; }
+    #controls { padding: 4px 0 8px 0; }
+    #controls label { margin-right: 12px; }
+    #map { width: 100%; height: {{ map_height }}px; }
+</style>
+</head>
+<body>
+<div id="controls">
+    <select id="field">
+        {%- for field, label in fields.items() %}
+        <option value="{{ field }}"{% if field == location_field %} selected{% endif %}>{{ label }}</option>
+        {%- endfor %}
+    </select>
+    <label><input type="checkbox" id="fractional"> Split the entries with several locations between them</label>
+    <div id="types"></div>
+    <div id="shown"></div>
+</div>
+<div id="map"></div>
+<script>
+    {{ shown }}
+    var data = {{ payload }};
+    var colors = {{ colors }};
+    var map = L.map("map", {center: [0, 0], zoom: 1.5});
+    L.tileLayer("https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png", {
+        attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors &copy; <a href="https://carto.com/attributions">CARTO</a>',
+        subdomains: "abcd",
+        maxZoom: 20
+    }).addTo(map);
+    var outlineCounts = {};
+    var outlineBins = [0, 1];
+    var outlines = L.geoJSON(data.geo, {style: outlineStyle}).addTo(map);
+    var markers = L.layerGroup().addTo(map);
+    // positions of the entries matching the filters of the page, null for all entries
+    var shownEntries = new Array(data.entry_types.length).fill(shown === null);
+    (shown || []).forEach(function(entry) { shownEntries[entry] = true; });
+    document.getElementById("shown").textContent = (shown === null ? data.entry_types.length : shown.length) + " of " + data.entry_types.length + " entries, as selected by the filters above";
+
+    function outlineStyle(feature) {
+        var count = outlineCounts[feature.properties.name] || 0;
+        var color = "white";
+        if (count > 0) {
+            var bin = Math.floor((count - outlineBins[0]) / (outlineBins[1] - outlineBins[0]) * colors.length);
+            color = colors[Math.max(0, Math.min(colors.length - 1, bin))];
+        }
+        return {color: "black", weight: 1, opacity: 1, fillColor: color, fillOpacity: 0.6};
+    }
+
+    function escapeHtml(text) {
+        var div = document.createElement("div");
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function update() {
+        var rows = data.fields[document.getElementById("field").value];
+        var fractional = document.getElementById("fractional").checked;
+        var shownTypes = data.types.map(function(type, i) {
+            return document.getElementById("type_" + i).checked;
+        });
+        // an entry listing k locations counts for 1/k in each of them
+        var entryLocations = new Array(data.entry_types.length).fill(0);
+        rows.entries.forEach(function(entry) { entryLocations[entry] += 1; });
+        var counts = new Array(data.locations.length).fill(0);
+        rows.entries.forEach(function(entry, i) {
+            if (shownEntries[entry] && shownTypes[data.entry_types[entry]]) {
+                counts[rows.locations[i]] += fractional ? 1 / entryLocations[entry] : 1;
+            }
+        });
+        outlineCounts = {};
+        markers.clearLayers();
+        counts.forEach(function(count, location) {
+            if (count <= 0) {
+                return;
+            }
+            count = Math.round(count * 100) / 100;
+            data.location_outlines[location].forEach(function(outline) {
+                var name = data.outlines[outline[0]];
+                outlineCounts[name] = (outlineCounts[name] || 0) + outline[1] * count;
+            });
+            var center = data.centers[location];
+            if (center !== null) {
+                var name = data.locations[location];
+                L.circleMarker(center, {radius: 4 + 2 * Math.sqrt(count), color: "#980043", weight: 1, fillOpacity: 0.6})
+                    .bindPopup((data.is_region[location] ? "Region" : "Country") + " : " + escapeHtml(name) + "<br> Resources : " + count + " <br>")
+                    .addTo(markers);
+            }
+        });
+        var values = Object.values(outlineCounts).filter(function(count) { return count > 0; });
+        outlineBins = values.length > 0 ? [Math.min.apply(null, values), Math.max.apply(null, values)] : [0, 1];
+        if (outlineBins[0] === outlineBins[1]) {
+            outlineBins[0] = 0;
+        }
+        outlines.setStyle(outlineStyle);
+    }
+
+    data.types.forEach(function(type, i) {
+        var label = document.createElement("label");
+        label.innerHTML = '<input type="checkbox" id="type_' + i + '" checked> ' + escapeHtml(type);
+        document.getElementById("types").appendChild(label);
+        label.firstChild.addEventListener("change", update);
+    });
+    document.getElementById("field").addEventListener("change", update);
+    document.getElementById("fractional").addEventListener("change", update);
+    update();
+</script>
+</body>
+</html>
+"""
+)
+
+
 class MarkerWithProps(Marker):
     _template = Template(
         """
@@ -68,79 +253,39 @@ class MarkerWithProps(Marker):
         self.props = json.loads(json.dumps(props))
 
 
-def get_region_center(region_name):
-    latitudes = []
-    longitudes = []
-    for name in region_tree[region_name]:
-        if name in region_tree:
-            region_latitudes, region_longitudes = get_region_center(name)
-            latitudes += region_latitudes
-            longitudes += region_longitudes
-        elif name in country_centers or name in country_mappings["to_center"]:
-            country_center = country_centers[
-                country_mappings["to_center"].get(name, name)
-            ]
-            latitudes += [float(country_center["latitude"])]
-            longitudes += [float(country_center["longitude"])]
-    return latitudes, longitudes
-
-
-def get_region_countries(region_name):
-    countries = []
-    for name in region_tree[region_name]:
-        if name in region_tree:
-            countries += get_region_countries(name)
-        else:
-            countries += [name]
-    return countries
+def choropleth_counts(resource_counts):
+    # (Name, Resources) rows for the outlines, counts can be fractional, names that
+    # are not known locations are not drawn
+    known = [name for name in resource_counts if name in map_locations]
+    location_counts = np.zeros(len(map_locations))
+    location_counts[[map_locations[name] for name in known]] = [
+        resource_counts[name] for name in known
+    ]
+    outline_counts = location_outlines @ location_counts
+    drawn = np.flatnonzero(outline_counts)
+    return pd.DataFrame(
+        {
+            "Name": [map_outlines[i] for i in drawn],
+            "Resources": outline_counts[drawn],
+        }
+    )
 
 
 def make_choro_map(resource_counts, marker_thres=0):
     world_map = folium.Map(tiles="cartodbpositron", location=[0, 0], zoom_start=1.5)
     marker_cluster = MarkerCluster(icon_create_function=ICON_CREATE_FUNCTIOM)
     marker_cluster.add_to(world_map)
+    # put a pin at the center of each country or region
     for name, count in resource_counts.items():
-        if name in country_centers or name in country_mappings["to_center"]:
-            country_center = country_centers[
-                country_mappings["to_center"].get(name, name)
-            ]
+        if name in location_centers:
             MarkerWithProps(
-                location=[country_center["latitude"], country_center["longitude"]],
+                location=location_centers[name],
                 popup=f"{'Region' if name in region_tree else 'Country'} : {name}<br> \n Resources : {count} <br>",
                 props={"name": name, "resources": count},
             ).add_to(marker_cluster)
-        # put a pin at the center of the region
-        elif name in region_tree:
-            latitudes, longitudes = get_region_center(name)
-            if len(latitudes) > 0:
-                lat = sum(latitudes) / len(latitudes)
-                lon = sum(longitudes) / len(longitudes)
-                MarkerWithProps(
-                    location=[lat, lon],
-                    popup=f"{'Region' if name in region_tree else 'Country'} : {name}<br> \n Resources : {count} <br>",
-                    props={"name": name, "resources": count},
-                ).add_to(marker_cluster)
-    # for choropleth, add counts to all countries in a region
-    choropleth_counts = {}
-    for loc_name in list(resource_counts.keys()):
-        if loc_name in region_tree:
-            for country_name in get_region_countries(loc_name):
-                choropleth_counts[country_name] = (
-                    choropleth_counts.get(country_name, 0) + resource_counts[loc_name]
-                )
-        else:
-            choropleth_counts[loc_name] = (
-                choropleth_counts.get(loc_name, 0) + resource_counts[loc_name]
-            )
-    df_resource_counts = pd.DataFrame(
-        [
-            (country_mappings["to_outline"].get(n, n), c)
-            for n, c in choropleth_counts.items()
-        ],
-        columns=["Name", "Resources"],
-    )
+    df_resource_counts = choropleth_counts(resource_counts)
     folium.Choropleth(
-        geo_data=WORLD_GEO_URL,
+        geo_data=get_world_outlines(),
         name="resource map",
         data=df_resource_counts,
         columns=["Name", "Resources"],
@@ -149,3 +294,103 @@ def make_choro_map(resource_counts, marker_thres=0):
         nan_fill_color="white",
     ).add_to(world_map)
     return world_map
+
+
+def map_key(resource_counts, **options):
+    content = json.dumps([sorted(resource_counts.items()), sorted(options.items())])
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def render_choro_map(resource_counts, marker_thres=0):
+    # html of make_choro_map as folium_static sends it to the page, the folium objects
+    # are only built for counts that are not among the last MAP_CACHE_SIZE ones
+    key = map_key(resource_counts, marker_thres=marker_thres)
+    with _map_cache_lock:
+        if key in _map_cache:
+            _map_cache.move_to_end(key)
+            return _map_cache[key]
+    world_map = make_choro_map(resource_counts, marker_thres=marker_thres)
+    html = folium.Figure().add_child(world_map).render()
+    with _map_cache_lock:
+        _map_cache[key] = html
+        while len(_map_cache) > MAP_CACHE_SIZE:
+            _map_cache.popitem(last=False)
+    return html
+
+
+def client_map_payload(catalogue_frame):
+    # entry types and the (entry, location) pairs of each field as integer lists, the
+    # locations with their marker position and the outlines they are counted on
+    types = sorted(catalogue_frame.entries["type"].unique())
+    type_index = {entry_type: i for i, entry_type in enumerate(types)}
+    locations = {}
+    fields = {}
+    for field in CLIENT_MAP_FIELDS:
+        values = catalogue_frame.values[field]
+        rows = values[values["specific"].to_numpy()]
+        fields[field] = {
+            "entries": rows["position"].tolist(),
+            "locations": [
+                locations.setdefault(v, len(locations)) for v in rows["value"]
+            ],
+        }
+    matrix = location_outlines.tocsc()
+    outlines = {}
+    outline_weights = []
+    for name in locations:
+        weights = []
+        if name in map_locations:
+            col = map_locations[name]
+            for row, weight in zip(
+                matrix.indices[matrix.indptr[col] : matrix.indptr[col + 1]],
+                matrix.data[matrix.indptr[col] : matrix.indptr[col + 1]],
+            ):
+                outline = outlines.setdefault(map_outlines[row], len(outlines))
+                weights += [[outline, int(weight)]]
+        outline_weights += [weights]
+    return {
+        "types": types,
+        "entry_types": [type_index[t] for t in catalogue_frame.entries["type"]],
+        "fields": fields,
+        "locations": list(locations),
+        "centers": [location_centers.get(name) for name in locations],
+        "is_region": [int(name in region_tree) for name in locations],
+        "outlines": list(outlines),
+        "location_outlines": outline_weights,
+        "geo": get_world_outlines(),
+    }
+
+
+def leaflet_assets():
+    # inlined in the client map page rather than loaded from a CDN
+    with _leaflet_lock:
+        if len(_leaflet_assets) == 0:
+            for fname in ["leaflet.js", "leaflet.css"]:
+                with open(pjoin(LEAFLET_DIR, fname), encoding="utf-8") as f:
+                    _leaflet_assets[fname] = f.read()
+        return _leaflet_assets
+
+
+def render_client_map(catalogue_frame, location_field, uids=None, map_height=600):
+    # built once per catalogue frame, i.e. per catalogue version, and location field,
+    # the entries matching the filters (all of them if uids is None) are then filled in
+    def render():
+        payload = json.dumps(client_map_payload(catalogue_frame), separators=(",", ":"))
+        assets = leaflet_assets()
+        return CLIENT_MAP_TEMPLATE.render(
+            leaflet_js=assets["leaflet.js"],
+            leaflet_css=assets["leaflet.css"],
+            shown=CLIENT_MAP_ALL_SHOWN,
+            payload=payload.replace("</", "<\\/"),
+            colors=json.dumps(CLIENT_MAP_COLORS),
+            fields=CLIENT_MAP_FIELDS,
+            location_field=location_field,
+            map_height=map_height,
+        )
+
+    page = catalogue_frame.aggregate(("client_map", location_field, map_height), render)
+    if uids is None:
+        return page
+    positions = catalogue_frame.uid_index.get_indexer(list(uids))
+    shown = sorted(set(positions[positions >= 0].tolist()))
+    return page.replace(CLIENT_MAP_ALL_SHOWN, f"var shown = {json.dumps(shown)};", 1)
@@ -0,0 +1,95 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+# number of matches sent to the language pickers
+LANGUAGE_TOP_K = 30
+# share of the query trigrams a language name needs for a fuzzy match
+MIN_TRIGRAM_SHARE = 0.5
+
+_language_index = None
+_language_index_lock = threading.Lock()
+
+
+def normalize(text):
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return set(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class LanguageIndex:
+    # prefix and trigram index over the BCP-47 language subtags and descriptions
+    # labels are the ", ".join(description) strings stored in language_names
+    def __init__(self, languages_bcp47):
+        self.languages = languages_bcp47
+        self.labels = [", ".join(x["description"]) for x in languages_bcp47]
+        self.subtags = {}  # registry subtag or ISO 639-3 alias -> label positions
+        words = {}
+        self.trigrams = {}
+        for position, (language, label) in enumerate(zip(languages_bcp47, self.labels)):
+            for subtag in [language["subtag"]] + language.get("aliases", []):
+                self.subtags.setdefault(subtag.lower(), []).append(position)
+            for word in normalize(label).split():
+                words.setdefault(word, set()).add(position)
+            for trigram in trigrams(normalize(label)):
+                self.trigrams.setdefault(trigram, []).append(position)
+        self.words = sorted(words)
+        self.word_positions = [words[word] for word in self.words]
+
+    def _prefix_positions(self, prefix):
+        positions = set()
+        i = bisect_left(self.words, prefix)
+        while i < len(self.words) and self.words[i].startswith(prefix):
+            positions |= self.word_positions[i]
+            i += 1
+        return positions
+
+    def search(self, query, k=LANGUAGE_TOP_K):
+        # labels of the best matches: ISO code, then full name, name prefix, word
+        # prefixes of all the query words, and finally names sharing enough trigrams
+        query = normalize(query)
+        if query == "":
+            return []
+        ranks = {}
+
+        def rank(positions, level):
+            for position in positions:
+                ranks[position] = min(ranks.get(position, level), level)
+
+        rank(self.subtags.get(query, []), 0)
+        query_words = query.split()
+        word_matches = self._prefix_positions(query_words[0])
+        for word in query_words[1:]:
+            word_matches &= self._prefix_positions(word)
+        for position in word_matches:
+            label = normalize(self.labels[position])
+            rank(
+                [position], 1 if label == query else 2 if label.startswith(query) else 3
+            )
+        query_trigrams = trigrams(query)
+        shared = Counter(
+            position
+            for trigram in query_trigrams
+            for position in self.trigrams.get(trigram, [])
+        )
+        for position, n_shared in shared.items():
+            share = n_shared / len(query_trigrams)
+            if share >= MIN_TRIGRAM_SHARE:
+                rank([position], 5 - share)
+        ranked = sorted(
+            ranks, key=lambda position: (ranks[position], len(self.labels[position]))
+        )
+        return list(dict.fromkeys(self.labels[position] for position in ranked))[:k]
+
+
+def search_languages(languages_bcp47, query, k=LANGUAGE_TOP_K):
+    global _language_index
+    with _language_index_lock:
+        if _language_index is None or _language_index.languages is not languages_bcp47:
+            _language_index = LanguageIndex(languages_bcp47)
+        language_index = _language_index
+    return language_index.search(query, k)
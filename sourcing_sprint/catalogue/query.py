@@ -0,0 +1,123 @@
+import argparse
+import json
+import re
+
+from .catalogue_index import get_catalogue_index
+from .catalogue_utils import load_catalogue
+from .resource_snapshot import get_resource
+
+# query field names -> entry field paths, dotted paths such as
+# `availability.pii.has_pii` can be used for the other fields
+QUERY_FIELDS = {
+    "type": ("type",),
+    "lang": ("languages", "language_names"),
+    "language": ("languages", "language_names"),
+    "loc": ("languages", "language_locations"),
+    "location": ("languages", "language_locations"),
+    "custodian": ("custodian", "type"),
+    "custodian_loc": ("custodian", "location"),
+    "download": ("availability", "procurement", "for_download"),
+    "license": ("availability", "licensing", "license_properties"),
+    "pii": ("availability", "pii", "has_pii"),
+    "source": ("source_category", "category_type"),
+    "web": ("source_category", "category_web"),
+    "collection": ("source_category", "category_media"),
+    "primary_license": ("processed_from_primary", "primary_license"),
+    "primary_type": ("processed_from_primary", "primary_types"),
+    "media": ("media", "category"),
+}
+
+# a region given for these fields also matches the countries and regions inside it,
+# as in the explorer's location filter
+LOCATION_PATHS = [("languages", "language_locations"), ("custodian", "location")]
+
+_term_re = re.compile(r'\s*([\w.]+):(?:"([^"]*)"|([^\s"]\S*))')
+
+
+def field_path(field):
+    if field in QUERY_FIELDS:
+        return QUERY_FIELDS[field]
+    if "." in field and all(field.split(".")):
+        return tuple(field.split("."))
+    raise ValueError(
+        f"Unknown query field `{field}`, use one of {', '.join(QUERY_FIELDS)} or a dotted entry path"
+    )
+
+
+def parse_query(query):
+    # `type:processed lang:Yoruba loc:Africa license:"open license"` -> filter_dict
+    # terms on different fields must all match, repeated fields match any of their
+    # values, as in filter_entry
+    region_descendants = get_resource("region_descendants")
+    filter_dct = {}
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        term = _term_re.match(query, position)
+        if term is None:
+            raise ValueError(
+                f'Could not parse the query at `{query[position:].strip()}`, terms look like field:value or field:"some value"'
+            )
+        field, quoted_value, value = term.groups()
+        value = quoted_value if quoted_value is not None else value
+        path = field_path(field)
+        sub_filter = filter_dct
+        for depth, k in enumerate(path):
+            is_field = depth == len(path) - 1
+            sub_filter = sub_filter.setdefault(k, [] if is_field else {})
+            # a dotted path can reach into a field given by an alias, or the reverse
+            if isinstance(sub_filter, list) != is_field:
+                raise ValueError(
+                    f"Query field `{field}` conflicts with another term: `{'.'.join(path[: depth + 1])}` can not be both a field and a group of fields"
+                )
+        values = [value]
+        if path in LOCATION_PATHS:
+            values += sorted(region_descendants.get(value, set()))
+        sub_filter += [v for v in values if v not in sub_filter]
+        position = term.end()
+    return filter_dct
+
+
+def get_query_index(catalogue=None):
+    # catalogue is a list of entries, by default the latest version of the stored ones
+    if catalogue is None:
+        catalogue = [entry_ls[-1] for entry_ls in load_catalogue()]
+    return get_catalogue_index([entry for entry in catalogue if entry["uid"] != ""])
+
+
+def query_entries(query, catalogue=None):
+    return get_query_index(catalogue).filter(parse_query(query))
+
+
+def query_uids(query, catalogue=None):
+    return [entry["uid"] for entry in query_entries(query, catalogue)]
+
+
+def query_counts(query, field, catalogue=None):
+    # number of matching entries for each value of field, list fields count each value
+    index = get_query_index(catalogue)
+    return index.value_counts(field_path(field), index.match(parse_query(query)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the catalogue entries")
+    parser.add_argument(
+        "query", help='e.g. type:processed lang:Yoruba license:"open license"'
+    )
+    parser.add_argument(
+        "--output", choices=["uids", "entries", "counts"], default="uids"
+    )
+    parser.add_argument(
+        "--count_by", default="type", help="query field for --output counts"
+    )
+    args = parser.parse_args()
+    if args.output == "uids":
+        print("\n".join(query_uids(args.query)))
+    elif args.output == "entries":
+        print(json.dumps(query_entries(args.query), indent=2))
+    else:
+        print(json.dumps(query_counts(args.query, args.count_by), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import pickle
+from os.path import isfile
+from os.path import join as pjoin
+
+RESOURCES_DIR = "resources"
+# bump whenever compile_resources changes so that existing snapshots get rebuilt
+SNAPSHOT_VERSION = 5
+
+_loaded_snapshots = {}  # resources_dir -> {name: pickled section}
+_loaded_resources = {}  # (resources_dir, name) -> unpickled section
+
+
+def region_closure(region_tree):
+    # region -> every region and country it contains, and region or country -> every
+    # region containing it, regions can overlap (e.g. Middle East and North Africa)
+    descendants = {}
+
+    def get_descendants(region):
+        if region not in descendants:
+            descendants[region] = set()
+            for name in region_tree[region]:
+                descendants[region] |= {name}
+                if name in region_tree:
+                    descendants[region] |= get_descendants(name)
+        return descendants[region]
+
+    ancestors = {}
+    for region in region_tree:
+        for name in get_descendants(region):
+            ancestors.setdefault(name, set()).add(region)
+    return descendants, ancestors
+
+
+def region_tables(region_tree, country_centers, to_center):
+    # flat versions of the region tree walks used by the maps: region -> leaf
+    # countries, with repeats when sub-regions overlap, and location -> [lat, lon],
+    # the center of a region being the mean of the centers of its countries
+    region_countries = {}
+
+    def get_countries(region):
+        if region not in region_countries:
+            region_countries[region] = []
+            for name in region_tree[region]:
+                if name in region_tree:
+                    region_countries[region] += get_countries(name)
+                else:
+                    region_countries[region] += [name]
+        return region_countries[region]
+
+    location_centers = {}
+    for name in list(country_centers) + list(to_center):
+        center = country_centers[to_center.get(name, name)]
+        # some countries have no coordinates, e.g. U.S. Minor Outlying Islands
+        if center["latitude"] != "" and center["longitude"] != "":
+            location_centers[name] = [
+                float(center["latitude"]),
+                float(center["longitude"]),
+            ]
+    for region in region_tree:
+        centers = [
+            location_centers[name]
+            for name in get_countries(region)
+            if name in location_centers
+        ]
+        if region not in location_centers and len(centers) > 0:
+            location_centers[region] = [
+                sum(lat for lat, _ in centers) / len(centers),
+                sum(lon for _, lon in centers) / len(centers),
+            ]
+    return region_countries, location_centers
+
+
+def compile_resources(resources_dir=RESOURCES_DIR):
+    def load(fname):
+        return json.load(open(pjoin(resources_dir, fname), encoding="utf-8"))
+
+    regions, countries, region_tree = load("country_regions.json")
+    region_descendants, region_ancestors = region_closure(region_tree)
+    country_centers = load("country_center_coordinates.json")
+    country_mappings = load("country_mappings.json")
+    region_countries, location_centers = region_tables(
+        region_tree, country_centers, country_mappings["to_center"]
+    )
+    # the registry uses the ISO 639-1 code when there is one, the ISO 639-3 code is
+    # kept as an alias so that both can be searched
+    iso639_aliases = load("iso639_aliases.json")
+
+    def language(x):
+        if x["subtag"] in iso639_aliases:
+            return {
+                "subtag": x["subtag"],
+                "description": x["description"],
+                "aliases": [iso639_aliases[x["subtag"]]],
+            }
+        return {"subtag": x["subtag"], "description": x["description"]}
+
+    # only keep the fields the app uses
+    return {
+        "language_lists": load("language_lists.json"),
+        "programming_languages": [
+            {"item": {"name": x["item"]["name"]}}
+            for x in load("programming_languages.json")["itemListElement"]
+        ],
+        "languages_bcp47": [
+            language(x)
+            for x in load("bcp47.json")["subtags"]
+            if x["type"] == "language"
+        ],
+        "pii_categories": load("pii_categories.json"),
+        "licenses": load("licenses.json"),
+        "primary_taxonomy": load("primary_source_taxonomy.json"),
+        "file_formats": load("file_formats.json"),
+        "regions": regions,
+        "countries": countries,
+        "region_tree": region_tree,
+        "region_descendants": region_descendants,
+        "region_ancestors": region_ancestors,
+        "region_countries": region_countries,
+        "location_centers": location_centers,
+        "country_centers": {
+            name: {"latitude": center["latitude"], "longitude": center["longitude"]}
+            for name, center in country_centers.items()
+        },
+        "country_mappings": country_mappings,
+    }
+
+
+def resources_hash(resources_dir=RESOURCES_DIR):
+    sha = hashlib.sha1(f"snapshot-v{SNAPSHOT_VERSION}".encode("utf-8"))
+    for fname in sorted(os.listdir(resources_dir)):
+        if fname.endswith(".json"):
+            sha.update(fname.encode("utf-8"))
+            sha.update(open(pjoin(resources_dir, fname), "rb").read())
+    return sha.hexdigest()[:16]
+
+
+def snapshot_path(resources_dir=RESOURCES_DIR, content_hash=None):
+    content_hash = content_hash or resources_hash(resources_dir)
+    return pjoin(resources_dir, f"snapshot-{content_hash}.pickle")
+
+
+def build_snapshot(resources_dir=RESOURCES_DIR, content_hash=None):
+    path = snapshot_path(resources_dir, content_hash)
+    # sections are pickled separately so that they can be unpickled on first use
+    sections = {
+        name: pickle.dumps(resource, protocol=pickle.HIGHEST_PROTOCOL)
+        for name, resource in compile_resources(resources_dir).items()
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(sections, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        for fname in os.listdir(resources_dir):
+            if fname.startswith("snapshot-") and pjoin(resources_dir, fname) != path:
+                os.remove(pjoin(resources_dir, fname))
+    except OSError:
+        # read-only deployments still work, they just parse the json every time
+        pass
+    return sections
+
+
+def load_snapshot(resources_dir=RESOURCES_DIR):
+    if resources_dir not in _loaded_snapshots:
+        content_hash = resources_hash(resources_dir)
+        path = snapshot_path(resources_dir, content_hash)
+        sections = None
+        if isfile(path):
+            try:
+                sections = pickle.load(open(path, "rb"))
+            except (pickle.UnpicklingError, EOFError):
+                sections = None
+        if sections is None:
+            sections = build_snapshot(resources_dir, content_hash)
+        _loaded_snapshots[resources_dir] = sections
+    return _loaded_snapshots[resources_dir]
+
+
+def get_resource(name, resources_dir=RESOURCES_DIR):
+    if (resources_dir, name) not in _loaded_resources:
+        _loaded_resources[(resources_dir, name)] = pickle.loads(
+            load_snapshot(resources_dir)[name]
+        )
+    return _loaded_resources[(resources_dir, name)]
+
+
+if __name__ == "__main__":
+    build_snapshot()
+    print(f"Wrote {snapshot_path()}")
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+from os.path import join as pjoin
+
+# country outlines from Natural Earth 1:110m (public domain), with feature names
+# matching the values of country_mappings["to_outline"]
+WORLD_OUTLINES_FNAME = pjoin("resources", "world_countries.geojson")
+# Douglas-Peucker tolerance in degrees for the outlines sent with the maps, 0 keeps
+# the vendored outlines as they are
+WORLD_OUTLINES_TOLERANCE = float(os.environ.get("CATALOGUE_MAP_TOLERANCE", 0.1))
+
+_world_outlines = {}  # (fname, tolerance) -> GeoJSON dict
+_world_outlines_lock = threading.Lock()
+
+
+def _point_line_distance(point, start, end):
+    (x, y), (x1, y1), (x2, y2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+    return ((x - x1 - t * dx) ** 2 + (y - y1 - t * dy) ** 2) ** 0.5
+
+
+def simplify_line(points, tolerance):
+    # Douglas-Peucker, the first and last points are always kept
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while len(stack) > 0:
+        first, last = stack.pop()
+        max_distance, max_i = 0, None
+        for i in range(first + 1, last):
+            distance = _point_line_distance(points[i], points[first], points[last])
+            if distance > max_distance:
+                max_distance, max_i = distance, i
+        if max_i is not None and max_distance > tolerance:
+            keep[max_i] = True
+            stack += [(first, max_i), (max_i, last)]
+    return [point for point, is_kept in zip(points, keep) if is_kept]
+
+
+def _junctions(rings):
+    # points where rings meet or part ways: a border shared by two countries runs
+    # between two junctions in both outlines, so it is simplified the same way in both
+    neighbours = {}
+    for ring in rings:
+        for i, point in enumerate(ring[:-1]):
+            previous_point = ring[i - 1] if i > 0 else ring[-2]
+            pair = frozenset([previous_point, ring[i + 1]])
+            neighbours.setdefault(point, set()).add(pair)
+    return set(point for point, pairs in neighbours.items() if len(pairs) > 1)
+
+
+def simplify_rings(rings, tolerance):
+    # rings: closed rings as lists of (x, y) tuples, returns the simplified rings
+    junctions = _junctions(rings)
+    simplified_arcs = {}
+
+    def simplify_arc(arc):
+        # arcs are simplified in a canonical direction so that both copies of a
+        # shared border give the same points
+        reverse = arc[-1] < arc[0]
+        key = tuple(arc[::-1] if reverse else arc)
+        if key not in simplified_arcs:
+            simplified_arcs[key] = simplify_line(key, tolerance)
+        return simplified_arcs[key][::-1] if reverse else simplified_arcs[key]
+
+    res = []
+    for ring in rings:
+        cuts = [i for i, point in enumerate(ring[:-1]) if point in junctions]
+        if len(cuts) == 0:
+            cuts = [0]
+        # rotate the ring to start on a junction, then split it at every junction
+        ring = ring[cuts[0] : -1] + ring[: cuts[0] + 1]
+        cuts = [i - cuts[0] for i in cuts] + [len(ring) - 1]
+        simplified = [ring[0]]
+        for start, end in zip(cuts[:-1], cuts[1:]):
+            simplified += simplify_arc(ring[start : end + 1])[1:]
+        # small islands could collapse, keep them as they were
+        res += [simplified if len(simplified) >= 4 else ring]
+    return res
+
+
+def simplify_outlines(world_outlines, tolerance):
+    polygons = []
+    for feature in world_outlines["features"]:
+        geometry = feature["geometry"]
+        if geometry["type"] == "Polygon":
+            polygons += [geometry["coordinates"]]
+        else:
+            polygons += geometry["coordinates"]
+    rings = [
+        [tuple(point) for point in ring] for polygon in polygons for ring in polygon
+    ]
+    simplified = iter(simplify_rings(rings, tolerance))
+    for polygon in polygons:
+        polygon[:] = [[list(point) for point in next(simplified)] for _ in polygon]
+    return world_outlines
+
+
+def get_world_outlines(tolerance=WORLD_OUTLINES_TOLERANCE, fname=WORLD_OUTLINES_FNAME):
+    # parsed and simplified once per process, the returned dict is shared
+    with _world_outlines_lock:
+        if (fname, tolerance) not in _world_outlines:
+            world_outlines = json.load(open(fname, encoding="utf-8"))
+            if tolerance > 0:
+                world_outlines = simplify_outlines(world_outlines, tolerance)
+            _world_outlines[(fname, tolerance)] = world_outlines
+    return _world_outlines[(fname, tolerance)]
@@ -94,9 +94,7 @@ MAX_LICENSES = 25
 ##################
 ## Mapping and visualization functions
 ##################
-WORLD_GEO_URL = (
-    "https://raw.githubusercontent.com/python-visualization/folium/master/examples/data/world-countries.json"
-)
+WORLD_GEO_FNAME = "resources/world_countries.geojson"
 
 ICON_CREATE_FUNCTIOM = """
     function(cluster) {
@@ -204,7 +202,7 @@ def make_choro_map(resource_counts, marker_thres=0):
         columns=["Name", "Resources"],
     )
     folium.Choropleth(
-        geo_data=WORLD_GEO_URL,
+        geo_data=WORLD_GEO_FNAME,
         name="resource map",
         data=df_resource_counts,
         columns=["Name", "Resources"],
@@ -0,0 +1,27 @@
+import os
+import sys
+from os.path import abspath, dirname
+
+import pytest
+
+# the app is run from sourcing_sprint: the catalogue package and the relative
+# resources/ paths resolve from there, whichever directory pytest is started from
+APP_DIR = dirname(dirname(abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(autouse=True)
+def app_dir(monkeypatch):
+    monkeypatch.chdir(APP_DIR)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_make_collect_report(collector):
+    # test modules import catalogue modules that load resources/ at import time
+    cwd = os.getcwd()
+    os.chdir(APP_DIR)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
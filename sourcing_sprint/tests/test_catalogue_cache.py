@@ -0,0 +1,89 @@
+import json
+from os.path import join as pjoin
+
+import pytest
+
+from catalogue.catalogue_index import get_catalogue_index
+from catalogue.catalogue_store import FileCatalogueStore
+
+
+def make_store(tmp_path):
+    entries_dir = tmp_path / "entries"
+    submitted_by_dir = tmp_path / "entry_submitted_by"
+    entries_dir.mkdir()
+    submitted_by_dir.mkdir()
+    for uid, entry_type in [("le_monde", "primary"), ("masakhane", "organization")]:
+        entry = {
+            "uid": uid,
+            "type": entry_type,
+            "description": {"name": uid, "description": ""},
+            "languages": {"language_names": ["French"], "language_locations": []},
+            "custodian": {"name": uid, "type": "", "location": "France"},
+        }
+        json.dump(entry, open(pjoin(entries_dir, f"{uid}.json"), "w"))
+    return FileCatalogueStore(str(entries_dir), str(submitted_by_dir))
+
+
+def latest_versions(store):
+    # what viz_page does on each rerun
+    return [entry_ls[-1] for entry_ls in store.load_catalogue()]
+
+
+def test_index_reused_across_reruns(tmp_path):
+    store = make_store(tmp_path)
+    index = get_catalogue_index(latest_versions(store))
+    assert get_catalogue_index(latest_versions(store)) is index
+
+
+def test_frame_and_aggregates_reused_across_reruns(tmp_path):
+    from catalogue.catalogue_frame import get_catalogue_frame
+
+    store = make_store(tmp_path)
+    frame = get_catalogue_frame(latest_versions(store))
+    counts = frame.aggregate(("type",), lambda: {"computed": True})
+    frame_again = get_catalogue_frame(latest_versions(store))
+    assert frame_again is frame
+    assert frame_again.aggregate(("type",), lambda: {}) is counts
+
+
+def test_client_map_built_once_across_reruns(tmp_path, monkeypatch):
+    pytest.importorskip("folium")
+    pytest.importorskip("scipy")
+    from catalogue import geography
+    from catalogue.catalogue_frame import get_catalogue_frame
+
+    n_payloads = []
+    client_map_payload = geography.client_map_payload
+    monkeypatch.setattr(
+        geography,
+        "client_map_payload",
+        lambda frame: n_payloads.append(1) or client_map_payload(frame),
+    )
+    store = make_store(tmp_path)
+    pages = [
+        geography.render_client_map(
+            get_catalogue_frame(latest_versions(store)), "language_locations"
+        )
+        for _ in range(3)
+    ]
+    assert len(n_payloads) == 1
+    assert pages[1] is pages[0] and pages[2] is pages[0]
+
+
+def test_client_map_shows_filtered_entries(tmp_path):
+    pytest.importorskip("folium")
+    pytest.importorskip("scipy")
+    from catalogue import geography
+    from catalogue.catalogue_frame import get_catalogue_frame
+
+    frame = get_catalogue_frame(latest_versions(make_store(tmp_path)))
+    page = geography.render_client_map(frame, "language_locations")
+    uids = list(frame.entries["uid"])
+    filtered = geography.render_client_map(
+        frame, "language_locations", [uids[-1], "not_an_entry"]
+    )
+    assert geography.CLIENT_MAP_ALL_SHOWN in page
+    assert f"var shown = [{len(uids) - 1}];" in filtered
+    # leaflet is inlined, the page only fetches map tiles
+    assert "<script src=" not in page and "<link " not in page
+    assert "Leaflet 1.9.3" in page
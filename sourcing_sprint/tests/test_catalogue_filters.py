@@ -0,0 +1,117 @@
+import random
+from collections import Counter
+
+from catalogue.catalogue_filters import compile_filter, filter_entry
+from catalogue.catalogue_index import CatalogueIndex, nested_filter
+
+# nested fields of the generated entries, None marks a leaf
+SCHEMA = {
+    "type": None,
+    "languages": {"language_names": None, "language_locations": None},
+    "custodian": {"type": None, "location": None, "name": None},
+    "availability": {
+        "procurement": {"for_download": None},
+        "pii": {"has_pii": None},
+    },
+}
+# "type" and "pii" are also field names: filter_entry checks a plain value found
+# where the filter has a sub-filter against the keys of the sub-filter
+VALUES = ["a", "b", "c", "type", "pii", 0, 1, None]
+MISSING = object()
+
+
+def random_value(rng):
+    if rng.random() < 0.5:
+        return rng.choice(VALUES)
+    return rng.sample(VALUES, rng.randint(0, 3))
+
+
+def random_entry(rng, schema=SCHEMA):
+    entry = {}
+    for k, sub_schema in schema.items():
+        if rng.random() < 0.2:
+            continue  # field missing
+        if sub_schema is None or rng.random() < 0.1:
+            entry[k] = random_value(rng)
+        else:
+            entry[k] = random_entry(rng, sub_schema)
+    return entry
+
+
+def random_filter(rng, schema=SCHEMA):
+    filter_dct = {}
+    for k, sub_schema in schema.items():
+        if rng.random() < 0.4:
+            continue
+        if sub_schema is None:
+            filter_dct[k] = rng.sample(VALUES, rng.choice([0, 1, 1, 2, 3]))
+        else:
+            filter_dct[k] = random_filter(rng, sub_schema)
+    return filter_dct
+
+
+def random_catalogue(seed, n_entries=300, n_filters=2000):
+    rng = random.Random(seed)
+    entries = [random_entry(rng) for _ in range(n_entries)]
+    filters = [random_filter(rng) for _ in range(n_filters)]
+    return entries, filters
+
+
+def test_compile_filter_matches_filter_entry():
+    entries, filters = random_catalogue(0)
+    n_matches = 0
+    for filter_dct in filters:
+        matches = compile_filter(filter_dct)
+        expected = [filter_entry(entry, filter_dct) for entry in entries]
+        assert [matches(entry) for entry in entries] == expected, filter_dct
+        n_matches += sum(expected)
+    # the filters neither match everything nor nothing
+    assert 0.05 < n_matches / (len(entries) * len(filters)) < 0.95
+
+
+def leaf_paths(schema=SCHEMA, path=()):
+    paths = []
+    for k, sub_schema in schema.items():
+        if sub_schema is None:
+            paths += [path + (k,)]
+        else:
+            paths += leaf_paths(sub_schema, path + (k,))
+    return paths
+
+
+def get_path(entry, path):
+    # the value at path, MISSING if the entry does not have it
+    for k in path:
+        if not isinstance(entry, dict) or k not in entry:
+            return MISSING
+        entry = entry[k]
+    return entry
+
+
+def test_index_filter_matches_filter_entry():
+    entries, filters = random_catalogue(1)
+    # only some of the fields are indexed up front, the others on first use
+    index = CatalogueIndex(entries, leaf_paths()[:3])
+    for filter_dct in filters:
+        expected = [entry for entry in entries if filter_entry(entry, filter_dct)]
+        assert index.filter(filter_dct) == expected, filter_dct
+
+
+def test_facet_counts_match_counting():
+    entries, _ = random_catalogue(2, n_filters=0)
+    index = CatalogueIndex(entries, leaf_paths()[:3])
+    rng = random.Random(2)
+    for _ in range(200):
+        paths = rng.sample(leaf_paths(), rng.randint(1, 4))
+        selection = {path: rng.sample(VALUES, rng.choice([0, 1, 2])) for path in paths}
+        counts = index.facet_counts(selection)
+        for path in paths:
+            # the entries matching the selections of the other fields, counted by the
+            # values they have for this one
+            others = nested_filter({p: v for p, v in selection.items() if p != path})
+            expected = Counter()
+            for entry in entries:
+                value = get_path(entry, path)
+                if value is not MISSING and filter_entry(entry, others):
+                    expected.update(value if isinstance(value, list) else [value])
+            assert {v: n for v, n in counts[path].items() if n > 0} == expected
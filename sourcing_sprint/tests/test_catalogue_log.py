@@ -0,0 +1,114 @@
+import os
+
+from catalogue.catalogue_log import LogCatalogueStore
+
+
+def make_entry(uid, description=""):
+    return {
+        "uid": uid,
+        "type": "primary",
+        "description": {"name": uid, "description": description},
+    }
+
+
+def latest(store):
+    return {
+        entry_ls[-1]["uid"]: entry_ls[-1]
+        for entry_ls in store.load_catalogue()
+        if entry_ls[-1]["uid"] != ""
+    }
+
+
+def segment_files(store):
+    return sorted(
+        fname for fname in os.listdir(store.log_dir) if fname.startswith("segment-")
+    )
+
+
+def test_append_and_reload(tmp_path):
+    store = LogCatalogueStore(str(tmp_path))
+    assert store.add_entry(make_entry("le_monde"), {"submitted_by": "a"})
+    assert not store.add_entry(make_entry("le_monde"), {"submitted_by": "b"})
+    assert store.add_validated_entry(
+        make_entry("le_monde", "v1"), {"validated_by": "c"}, "12_30_2021__10_00_00"
+    )
+    assert not store.add_validated_entry(
+        make_entry("le_monde", "v1"), {"validated_by": "c"}, "12_30_2021__10_00_00"
+    )
+    assert store.has_entry("le_monde") and not store.has_entry("masakhane")
+    # another process sees the appended records
+    other = LogCatalogueStore(str(tmp_path))
+    entry_ls = [
+        e_ls for e_ls in other.load_catalogue() if e_ls[0]["uid"] == "le_monde"
+    ][0]
+    assert [e.get("update_time", "") for e in entry_ls] == ["", "12_30_2021__10_00_00"]
+    assert entry_ls[-1]["description"]["description"] == "v1"
+    assert other.get_submission_info("le_monde") == {"submitted_by": "a"}
+    # records appended after the first read are picked up incrementally
+    assert store.add_entry(make_entry("masakhane"), {"submitted_by": "d"})
+    assert set(latest(other)) == {"le_monde", "masakhane"}
+
+
+def test_partial_line_is_skipped_then_dropped(tmp_path):
+    store = LogCatalogueStore(str(tmp_path))
+    assert store.add_entry(make_entry("le_monde"), {})
+    # a writer crashed in the middle of a record
+    with open(store._path(1), "ab") as f:
+        f.write(b'{"uid": "masak')
+    assert set(latest(LogCatalogueStore(str(tmp_path)))) == {"le_monde"}
+    assert store.add_entry(make_entry("masakhane"), {})
+    assert set(latest(LogCatalogueStore(str(tmp_path)))) == {"le_monde", "masakhane"}
+
+
+def test_compact_keeps_latest_version_across_years(tmp_path):
+    store = LogCatalogueStore(str(tmp_path))
+    assert store.add_entry(make_entry("le_monde"), {"submitted_by": "a"})
+    # later as a date, earlier as a string
+    for update_time in ["12_30_2021__10_00_00", "01_02_2022__09_00_00"]:
+        assert store.add_validated_entry(
+            make_entry("le_monde", update_time), {"validated_by": "b"}, update_time
+        )
+    assert store.add_entry(make_entry("masakhane"), {"submitted_by": "c"})
+    assert latest(store)["le_monde"]["update_time"] == "01_02_2022__09_00_00"
+    reader = LogCatalogueStore(str(tmp_path))
+    reader.load_catalogue()
+    assert store.compact() == 2
+    assert segment_files(store) == ["segment-000002.idx", "segment-000002.jsonl"]
+    for compacted in [store, reader, LogCatalogueStore(str(tmp_path))]:
+        entries = latest(compacted)
+        assert entries["le_monde"]["update_time"] == "01_02_2022__09_00_00"
+        assert (
+            entries["le_monde"]["description"]["description"] == "01_02_2022__09_00_00"
+        )
+        assert "update_time" not in entries["masakhane"]
+        assert compacted.get_submission_info("masakhane") == {"submitted_by": "c"}
+    # appends go to the compacted segment
+    assert store.add_entry(make_entry("bigscience"), {})
+    assert set(latest(reader)) == {"le_monde", "masakhane", "bigscience"}
+
+
+def test_segment_removed_mid_read(tmp_path, monkeypatch):
+    store = LogCatalogueStore(str(tmp_path))
+    assert store.add_entry(make_entry("le_monde"), {"submitted_by": "a"})
+    reader = LogCatalogueStore(str(tmp_path))
+    read_lines = LogCatalogueStore._read_lines
+    armed = []
+
+    def compact_then_read(path, pos):
+        # another process compacts between the reader's listing and its read
+        if len(armed) > 0:
+            armed.clear()
+            store.compact()
+        return read_lines(path, pos)
+
+    monkeypatch.setattr(
+        LogCatalogueStore, "_read_lines", staticmethod(compact_then_read)
+    )
+    armed.append(True)
+    assert set(latest(reader)) == {"le_monde"}
+    assert len(armed) == 0 and segment_files(store)[-1] == "segment-000002.jsonl"
+    assert store.add_entry(make_entry("masakhane"), {"submitted_by": "b"})
+    armed.append(True)
+    assert reader.get_submission_info("masakhane") == {"submitted_by": "b"}
+    assert len(armed) == 0 and segment_files(store)[-1] == "segment-000003.jsonl"
+    assert reader.has_entry("masakhane")
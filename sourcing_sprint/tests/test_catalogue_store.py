@@ -0,0 +1,277 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+from copy import deepcopy
+from os.path import join as pjoin
+
+from catalogue.catalogue_store import (
+    CHECKPOINT_INTERVAL,
+    DELTA_SUFFIX,
+    CatalogueStore,
+    FileCatalogueStore,
+    entry_fname,
+    shard_entries_dir,
+)
+from catalogue.entry_patch import apply_patch, make_patch
+
+ENTRY_FNAMES = [
+    "ksucca_king_saud_university_corpus_of_classical_arabic.json",
+    "le_monde_newspaper.json",
+    "masakhane.json",
+]
+
+
+def load_entries():
+    return [json.load(open(pjoin("entries", fname))) for fname in ENTRY_FNAMES]
+
+
+def update_time(i):
+    # the format of the app's friendly_date
+    return f"01_02_2022__10_{i // 60:02d}_{i % 60:02d}"
+
+
+def edited(entry, i):
+    entry = deepcopy(entry)
+    entry["description"]["description"] += f" edit {i}"
+    entry["languages"]["language_names"] = entry["languages"]["language_names"][:-1]
+    if i % 3 == 0:
+        entry["custodian"].pop("contact_email", None)
+    else:
+        entry["custodian"]["new/key~"] = i
+    return entry
+
+
+def empty_store(tmp_path):
+    entries_dir = tmp_path / "entries"
+    submitted_by_dir = tmp_path / "entry_submitted_by"
+    entries_dir.mkdir(parents=True)
+    submitted_by_dir.mkdir()
+    return FileCatalogueStore(str(entries_dir), str(submitted_by_dir))
+
+
+def make_store(tmp_path, entry, n_versions):
+    store = empty_store(tmp_path)
+    assert store.add_entry(entry, {"submitted_by": "test"})
+    versions = [entry]
+    for i in range(1, n_versions + 1):
+        versions += [edited(versions[-1], i)]
+        assert store.add_validated_entry(
+            versions[-1], {"validated_by": "test"}, update_time(i)
+        )
+    return store, versions
+
+
+def strip(entry_dct):
+    return {k: v for k, v in entry_dct.items() if k not in ["fname", "update_time"]}
+
+
+def test_patch_round_trip_real_entries():
+    entries = load_entries()
+    for old in entries:
+        for new in entries + [edited(old, 1), edited(old, 3)]:
+            # patches are stored as JSON
+            patch = json.loads(json.dumps(make_patch(old, new)))
+            assert apply_patch(deepcopy(old), patch) == new
+            assert make_patch(old, old) == []
+
+
+def test_checkpoint_every_interval(tmp_path):
+    entry = load_entries()[1]
+    n_versions = 2 * CHECKPOINT_INTERVAL + 3
+    store, versions = make_store(tmp_path, entry, n_versions)
+    for i in range(1, n_versions + 1):
+        is_full = os.path.isfile(
+            pjoin(store.entries_dir, entry_fname(entry["uid"], update_time(i)))
+        )
+        assert is_full == (i % CHECKPOINT_INTERVAL == 0)
+    entry_ls = [
+        e_ls for e_ls in store.load_catalogue() if e_ls[-1]["uid"] == entry["uid"]
+    ][0]
+    assert len(entry_ls) == n_versions + 1
+    for entry_dct, version in zip(entry_ls, versions):
+        assert strip(store.load_version(entry_dct)) == version
+
+
+def test_orphaned_delta_in_chain(tmp_path):
+    entry = load_entries()[2]
+    n_versions = CHECKPOINT_INTERVAL + 1
+    store, versions = make_store(tmp_path, entry, n_versions)
+    # deltas 4 to CHECKPOINT_INTERVAL - 1 build on version 3, the checkpoint and the
+    # delta after it do not
+    os.remove(
+        pjoin(store.entries_dir, entry_fname(entry["uid"], update_time(3), delta=True))
+    )
+    entry_ls = [
+        e_ls for e_ls in store.load_catalogue() if e_ls[-1]["uid"] == entry["uid"]
+    ][0]
+    kept = [0, 1, 2, CHECKPOINT_INTERVAL, CHECKPOINT_INTERVAL + 1]
+    assert [e.get("update_time", "") for e in entry_ls] == [
+        update_time(i) if i > 0 else "" for i in kept
+    ]
+    for entry_dct, i in zip(entry_ls, kept):
+        assert strip(store.load_version(entry_dct)) == versions[i]
+
+
+def test_corrupt_latest_delta(tmp_path):
+    entry = load_entries()[0]
+    store, versions = make_store(tmp_path, entry, 2)
+    delta_path = pjoin(
+        store.entries_dir, entry_fname(entry["uid"], update_time(2), delta=True)
+    )
+    assert delta_path.endswith(DELTA_SUFFIX)
+    delta_dct = json.load(open(delta_path))
+    delta_dct["patch"] += [{"op": "remove", "path": "/no/such/field"}]
+    json.dump(delta_dct, open(delta_path, "w"))
+    entry_ls = [
+        e_ls for e_ls in store.load_catalogue() if e_ls[-1]["uid"] == entry["uid"]
+    ][0]
+    assert len(entry_ls) == 2
+    assert strip(entry_ls[-1]) == versions[1]
+
+
+def race_add(store, entry, barrier, results, i):
+    barrier.wait()
+    results.put((i, store.add_entry(dict(entry, name=i), {"submitted_by": str(i)})))
+
+
+def race_validate(store, entry, barrier, results, i):
+    barrier.wait()
+    saved = [
+        store.add_validated_entry(
+            edited(entry, i * 10 + j), {"validated_by": str(i)}, update_time(i * 10 + j)
+        )
+        for j in range(5)
+    ]
+    results.put((i, saved))
+
+
+def run_race(target, store, entry, n_processes=2):
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(n_processes)
+    results = context.Queue()
+    processes = [
+        context.Process(target=target, args=(store, entry, barrier, results, i))
+        for i in range(n_processes)
+    ]
+    for process in processes:
+        process.start()
+    res = dict(results.get(timeout=30) for _ in processes)
+    for process in processes:
+        process.join()
+    return [res[i] for i in range(n_processes)]
+
+
+def test_add_entry_race(tmp_path):
+    entry = load_entries()[1]
+    for attempt in range(10):
+        store = empty_store(tmp_path / str(attempt))
+        saved = run_race(race_add, store, entry)
+        # one save goes through, the other finds the entry (False) or the uid locked
+        assert saved.count(True) == 1
+        assert all(s in [True, False, None] for s in saved)
+        winner = saved.index(True)
+        stored = json.load(open(pjoin(store.entries_dir, entry_fname(entry["uid"]))))
+        assert stored["name"] == winner
+        assert os.listdir(store.entries_dir) == [entry_fname(entry["uid"])]
+
+
+def test_add_validated_entry_race(tmp_path):
+    entry = load_entries()[2]
+    store, _ = make_store(tmp_path, entry, 0)
+    saved = run_race(race_validate, store, entry)
+    n_saved = sum(s is True for s in saved[0] + saved[1])
+    assert all(s in [True, None] for s in saved[0] + saved[1])
+    entry_ls = [
+        e_ls for e_ls in store.load_catalogue() if e_ls[-1]["uid"] == entry["uid"]
+    ][0]
+    # every saved version is listed and rebuilds from its deltas
+    assert len(entry_ls) == n_saved + 1
+    for entry_dct in entry_ls:
+        assert store.load_version(entry_dct) is not None
+    assert not any(fname.endswith(".lock") for fname in os.listdir(store.entries_dir))
+
+
+def test_reserve_busy_and_leftover_lock(tmp_path):
+    entry = load_entries()[0]
+    store, _ = make_store(tmp_path, entry, 0)
+    with store._reserve(entry["uid"]) as reserved:
+        assert reserved
+        assert store.add_validated_entry(entry, {}, update_time(1)) is None
+    # a lock file left behind without a holder does not block writers
+    open(pjoin(store.entries_dir, f"{entry['uid']}.lock"), "w").close()
+    assert store.add_validated_entry(entry, {}, update_time(1))
+
+
+def test_versions_flat_and_sharded(tmp_path):
+    entry = load_entries()[1]
+    store, _ = make_store(tmp_path, entry, 3)
+    versions = ["", update_time(1), update_time(2), update_time(3)]
+    assert store.get_versions(entry["uid"]) == versions
+    assert not store.add_validated_entry(entry, {}, update_time(2))
+    shard_entries_dir(store.entries_dir)
+    store = FileCatalogueStore(store.entries_dir, store.submitted_by_dir)
+    assert store.sharded
+    assert store.get_versions(entry["uid"]) == versions
+    assert not store.add_validated_entry(entry, {}, update_time(2))
+    assert store.add_validated_entry(entry, {}, update_time(4))
+    assert store.get_versions("no_such_uid") == []
+
+
+def test_rejected_add_leaves_no_uid_dir(tmp_path):
+    store = empty_store(tmp_path)
+    shard_entries_dir(store.entries_dir)
+    store = FileCatalogueStore(store.entries_dir, store.submitted_by_dir)
+    entry = load_entries()[0]
+    with store._reserve(entry["uid"]):
+        assert store.add_entry(entry, {}) is None
+    assert os.listdir(store.entries_dir) == ["manifest.json"]
+    assert store.add_entry(entry, {})
+    assert [e_ls[-1]["uid"] for e_ls in store.load_catalogue()] == ["", entry["uid"]]
+
+
+def test_sqlite_import_and_load(tmp_path):
+    entry = load_entries()[1]
+    file_store, versions = make_store(tmp_path, entry, CHECKPOINT_INTERVAL + 2)
+    store = CatalogueStore(str(tmp_path / "catalogue.db"))
+    n_imported = store.import_directories(
+        file_store.entries_dir, file_store.submitted_by_dir
+    )
+    assert n_imported == len(versions)
+    entry_ls = store.load_catalogue()[-1]
+    assert [strip(e) for e in entry_ls] == versions
+    assert store.get_versions(entry["uid"]) == [
+        e.get("update_time", "") for e in entry_ls
+    ]
+    assert not store.add_validated_entry(entry, {}, entry_ls[-1]["update_time"])
+
+
+def test_sqlite_drops_old_field_indexes(tmp_path):
+    db_path = str(tmp_path / "catalogue.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE entries (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid TEXT NOT NULL,
+            update_time TEXT NOT NULL,
+            is_latest INTEGER NOT NULL DEFAULT 1,
+            type TEXT NOT NULL DEFAULT '',
+            custodian_type TEXT NOT NULL DEFAULT '',
+            custodian_location TEXT NOT NULL DEFAULT '',
+            entry TEXT NOT NULL,
+            UNIQUE (uid, update_time)
+        );
+        CREATE INDEX entries_type ON entries (type, is_latest);
+        CREATE TABLE entry_language_names (seq INTEGER, language_name TEXT);
+        CREATE TABLE entry_language_locations (seq INTEGER, language_location TEXT);
+        """
+    )
+    conn.close()
+    store = CatalogueStore(db_path)
+    entry = load_entries()[0]
+    assert store.add_entry(entry, {"submitted_by": "test"})
+    assert strip(store.load_catalogue()[-1][0]) == entry
+    names = [name for (name,) in store.conn.execute("SELECT name FROM sqlite_master")]
+    assert "entry_language_names" not in names
+    assert "entries_type" not in names
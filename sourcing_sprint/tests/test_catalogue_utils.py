@@ -0,0 +1,26 @@
+from catalogue.catalogue_utils import LazyCategories, app_categories
+
+
+def test_lazy_categories_mapping():
+    loaded = []
+    categories = LazyCategories(
+        {"entry_types": {"primary": "Primary source"}},
+        loaders={"languages": lambda: loaded.append(1) or ["Yoruba"]},
+    )
+    assert list(categories) == ["entry_types", "languages"]
+    assert len(categories) == 2
+    assert "languages" in categories and "licenses" not in categories
+    assert loaded == []
+    assert categories.get("licenses", []) == []
+    assert dict(categories.items()) == {
+        "entry_types": {"primary": "Primary source"},
+        "languages": ["Yoruba"],
+    }
+    assert categories["languages"] is categories.get("languages")
+    assert loaded == [1]
+    assert list(categories.keys()) == ["entry_types", "languages"]
+
+
+def test_app_categories_list_lazy_keys():
+    assert "languages_bcp47" in app_categories.keys()
+    assert len(app_categories) == len(set(app_categories))
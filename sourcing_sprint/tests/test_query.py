@@ -0,0 +1,101 @@
+import re
+
+import pytest
+
+from catalogue.query import parse_query, query_counts, query_uids
+
+
+def test_quoting():
+    assert parse_query('license:"open license" type:processed') == {
+        "availability": {"licensing": {"license_properties": ["open license"]}},
+        "type": ["processed"],
+    }
+    assert parse_query(' media:"" ') == {"media": {"category": [""]}}
+    # quotes only delimit a whole value
+    assert parse_query('lang:Yor"uba') == {"languages": {"language_names": ['Yor"uba']}}
+
+
+def test_aliases_and_repeated_fields():
+    assert parse_query("lang:Yoruba language:Igbo lang:Yoruba") == {
+        "languages": {"language_names": ["Yoruba", "Igbo"]}
+    }
+    # dotted paths and aliases of the same field share their values
+    assert parse_query("pii:Yes availability.pii.has_pii:No") == {
+        "availability": {"pii": {"has_pii": ["Yes", "No"]}}
+    }
+    assert parse_query("pii:Yes download:Yes") == {
+        "availability": {
+            "pii": {"has_pii": ["Yes"]},
+            "procurement": {"for_download": ["Yes"]},
+        }
+    }
+
+
+def test_locations_include_regions_inside():
+    filter_dct = parse_query("loc:Africa custodian_loc:France")
+    language_locations = filter_dct["languages"]["language_locations"]
+    assert language_locations[0] == "Africa"
+    assert {"Western Africa", "Nigeria", "Kenya"} <= set(language_locations)
+    assert "France" not in language_locations
+    assert filter_dct["custodian"]["location"][0] == "France"
+    # regions and their countries are only listed once
+    filter_dct = parse_query("loc:Africa loc:Nigeria loc:Africa")
+    language_locations = filter_dct["languages"]["language_locations"]
+    assert len(language_locations) == len(set(language_locations))
+    # other fields are not expanded
+    assert parse_query("lang:Africa") == {"languages": {"language_names": ["Africa"]}}
+
+
+def test_query_catalogue():
+    catalogue = [
+        {"uid": "", "type": ""},
+        {
+            "uid": "le_monde",
+            "type": "primary",
+            "languages": {"language_names": ["French"], "language_locations": []},
+            "custodian": {"location": "France"},
+        },
+        {
+            "uid": "masakhane",
+            "type": "organization",
+            "languages": {
+                "language_names": ["Yoruba", "Igbo"],
+                "language_locations": ["Nigeria"],
+            },
+            "custodian": {"location": "Nigeria"},
+        },
+    ]
+    assert query_uids("custodian_loc:Africa", catalogue) == ["masakhane"]
+    assert query_uids("custodian_loc:Europe type:primary", catalogue) == ["le_monde"]
+    assert query_uids("type:primary type:organization", catalogue) == [
+        "le_monde",
+        "masakhane",
+    ]
+    assert query_counts("loc:Africa", "lang", catalogue) == {"Yoruba": 1, "Igbo": 1}
+
+
+@pytest.mark.parametrize(
+    "query, message",
+    [
+        ("Yoruba", "Could not parse the query at `Yoruba`"),
+        ("lang:", "Could not parse the query at `lang:`"),
+        ('lang:"Yoruba', 'Could not parse the query at `lang:"Yoruba`'),
+        ("type:primary lang", "Could not parse the query at `lang`"),
+        ("language_name:Yoruba", "Unknown query field `language_name`"),
+        ("languages..language_names:Yoruba", "Unknown query field"),
+        ("type:primary type.name:x", "`type` can not be both a field"),
+        ("type.name:x type:primary", "`type` can not be both a field"),
+        ("lang:Yoruba languages:x", "Unknown query field `languages`"),
+        (
+            "pii:Yes availability.pii:x",
+            "`availability.pii` can not be both a field",
+        ),
+        (
+            "availability.pii:x pii:Yes",
+            "`availability.pii` can not be both a field",
+        ),
+    ],
+)
+def test_bad_queries(query, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        parse_query(query)